@@ -93,6 +93,22 @@ class SitesViewsetTestCase(TestCase):
                                 format_kwarg={}).current(request)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_list_retrieve(self):
+        """
+        list and retrieve
+        """
+        site = self.site_factory.create_site()
+        request = self.factory.get('/api/v1/sites/')
+        response = SitesViewset.as_view({"get": "list"})(request)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(site.domain, [item["domain"] for item in response.data])
+        request = self.factory.get(f'/api/v1/sites/{site.pk}/')
+        response = SitesViewset.as_view({"get": "retrieve"})(request, pk=site.pk)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["domain"], site.domain)
+        response = SitesViewset.as_view({"get": "retrieve"})(request, pk="0")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
 class UsersViewsetTestCase(TestCase):
     """
     UsersViewset test case
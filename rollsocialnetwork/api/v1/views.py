@@ -13,6 +13,7 @@ from rest_framework import status
 from rest_framework.authtoken.models import Token
 from django.contrib.sites.models import Site
 from django.contrib.auth import get_user_model
+from django.http import Http404
 from django.utils import timezone
 from oauth2_provider.exceptions import OAuthToolkitError  # type: ignore[import-untyped]
 from oauth2_provider.views.mixins import OAuthLibMixin  # type: ignore[import-untyped]
@@ -24,6 +25,7 @@ from oauth2_provider.models import (  # type: ignore[import-untyped]
 from rollsocialnetwork.phone_auth.login_methods import available_methods
 from rollsocialnetwork.phone_auth.models import VerificationCode
 from rollsocialnetwork.phone_auth.utils import format_pn
+from rollsocialnetwork.sites import site_registry
 from .serializers import (
     SiteSerializer,
     UserSerializer,
@@ -36,10 +38,22 @@ from .serializers import (
 class SitesViewset(viewsets.ReadOnlyModelViewSet):  # pylint: disable=R0901
     """
     sites viewset
+
+    sites are read from the site registry
     """
     queryset = Site.objects.all()
     serializer_class = SiteSerializer
 
+    def get_queryset(self):
+        return site_registry.all()
+
+    def get_object(self):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            return site_registry.get(int(self.kwargs[lookup_url_kwarg]))
+        except (Site.DoesNotExist, ValueError) as error:
+            raise Http404 from error
+
     @action(detail=False)
     def current(self, request: Request):
         """
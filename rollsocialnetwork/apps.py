@@ -0,0 +1,13 @@
+"""
+rollsocialnetwork apps
+"""
+from django.apps import AppConfig
+
+class RollSocialNetworkConfig(AppConfig):
+    """
+    rollsocialnetwork app config
+    """
+    name = "rollsocialnetwork"
+
+    def ready(self) -> None:
+        import rollsocialnetwork.signals  # pylint: disable=C0415,W0611
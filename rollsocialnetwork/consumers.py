@@ -1,35 +1,216 @@
 """
 rollsocialnetwork consumers
 """
-from typing import Dict
-from asgiref.sync import async_to_sync
-from channels.generic.websocket import JsonWebsocketConsumer  # type: ignore[import-untyped]
-from .watcher import Watcher
+import asyncio
+from typing import (
+    Dict,
+    List,
+    Optional,
+    Set,
+)
+from django.conf import settings
+from channels.db import database_sync_to_async  # type: ignore[import-untyped]
+from channels.generic.websocket import AsyncJsonWebsocketConsumer  # type: ignore[import-untyped]
+from .metrics import registry as metrics
+from .watcher import (
+    BINARY_SUBPROTOCOL,
+    Watcher,
+    pack_messages,
+    track_groups,
+)
 
-class WatcherConsumer(JsonWebsocketConsumer):
+CONNECTIONS_OPENED_TOTAL = metrics.counter("watcher_connections_opened_total",
+                                           "Watcher websocket connections opened.")
+CONNECTIONS_CLOSED_TOTAL = metrics.counter("watcher_connections_closed_total",
+                                           "Watcher websocket connections closed.")
+CONNECTIONS_ACTIVE = metrics.gauge("watcher_connections_active",
+                                   "Watcher websocket connections open.")
+SUBSCRIPTIONS_ACTIVE = metrics.gauge("watcher_subscriptions_active",
+                                     "Watcher websocket subscriptions.")
+SUBSCRIPTIONS_PER_CONNECTION = metrics.histogram("watcher_subscriptions_per_connection",
+                                                 "Subscriptions of closed connections.",
+                                                 buckets=(0, 1, 5, 10, 25, 50, 100, 200, 500))
+SUBSCRIPTIONS_REJECTED_TOTAL = metrics.counter("watcher_subscriptions_rejected_total",
+                                               "Refs rejected by the subscriptions limit.")
+MESSAGES_SENT_TOTAL = metrics.counter("watcher_messages_sent_total",
+                                      "Watcher updates sent to websocket clients.")
+
+class WatcherConsumer(AsyncJsonWebsocketConsumer):
     """
     watcher consumer
+
+    messages:
+    - {"subscribe": [ref, ...]}
+    - {"unsubscribe": [ref, ...]}
+    - {"ref": ref}, same as subscribe to a single ref
+
+    subscribed refs are answered with their current values. Messages carry
+    the group sequence number; a reconnecting client resumes by sending the
+    last seq it received in the ref, e.g. {"model": ..., "pk": ..., "seq": 42},
+    and only receives the value again if it changed meanwhile.
+
+    clients opting in the watcher.binary.v1 subprotocol receive the code
+    table as JSON on connect, then the updates batched in binary frames
+    every WATCHER_BINARY_FLUSH_INTERVAL seconds
     """
 
-    def connect(self):
-        self.accept()
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.subscriptions: Set[str] = set()
+        self.binary = False
+        self.pending_updates: List[Dict] = []
+        self.flush_task: Optional[asyncio.Task] = None
+
+    async def connect(self):
+        Watcher.attach_event_loop()
+        CONNECTIONS_OPENED_TOTAL.inc()
+        CONNECTIONS_ACTIVE.inc()
+        if BINARY_SUBPROTOCOL in self.scope.get("subprotocols", []):
+            self.binary = True
+            await self.accept(BINARY_SUBPROTOCOL)
+            await self.send_json({
+                "type": "codes",
+                "codes": Watcher.get_codes()
+            })
+            return
+        await self.accept()
+
+    async def disconnect(self, code):
+        if self.flush_task is not None:
+            self.flush_task.cancel()
+            self.flush_task = None
+        self.pending_updates.clear()
+        CONNECTIONS_CLOSED_TOTAL.inc()
+        CONNECTIONS_ACTIVE.dec()
+        SUBSCRIPTIONS_PER_CONNECTION.observe(len(self.subscriptions))
+        SUBSCRIPTIONS_ACTIVE.dec(len(self.subscriptions))
+        track_groups(self.subscriptions, -1)
+        await asyncio.gather(*[
+            self.channel_layer.group_discard(group_name, self.channel_name)
+            for group_name in self.subscriptions
+        ])
+        self.subscriptions.clear()
 
-    def receive_json(self, content: Dict, **kwargs) -> None:
+    async def receive_json(self, content: Dict, **kwargs) -> None:
         """
         receive json
         """
-        ref = content.get("ref")
-        if not ref:
-            raise ValueError("ref field not found")
-        model, attr, pk = Watcher.destructe_ref(ref)
-        group_name = Watcher.build_group_name(model, attr, pk=pk)
-        async_to_sync(self.channel_layer.group_add)(
-            group_name,
-            self.channel_name
-        )
+        if "subscribe" in content:
+            await self.subscribe(content["subscribe"])
+        elif "unsubscribe" in content:
+            await self.unsubscribe(content["unsubscribe"])
+        else:
+            ref = content.get("ref")
+            if not ref:
+                raise ValueError("ref field not found")
+            await self.subscribe([ref])
+
+    async def send_error(self, error: str, refs: List) -> None:
+        """
+        send error
+        """
+        await self.send_json({
+            "type": "error",
+            "error": error,
+            "refs": refs
+        })
+
+    async def subscribe(self, refs) -> None:
+        """
+        subscribe refs, up to WATCHER_MAX_SUBSCRIPTIONS per connection
+        """
+        try:
+            group_names = Watcher.build_group_names(refs)
+        except ValueError as error:
+            await self.send_error(str(error), refs if isinstance(refs, list) else [])
+            return
+        new_group_names = [group_name
+                           for group_name in group_names
+                           if group_name not in self.subscriptions]
+        available = max(settings.WATCHER_MAX_SUBSCRIPTIONS - len(self.subscriptions), 0)
+        rejected = new_group_names[available:]
+        new_group_names = new_group_names[:available]
+        self.subscriptions.update(new_group_names)
+        SUBSCRIPTIONS_ACTIVE.inc(len(new_group_names))
+        track_groups(new_group_names, 1)
+        await asyncio.gather(*[
+            self.channel_layer.group_add(group_name, self.channel_name)
+            for group_name in new_group_names
+        ])
+        if rejected:
+            SUBSCRIPTIONS_REJECTED_TOTAL.inc(len(rejected))
+            await self.send_error("subscriptions limit exceeded",
+                                  [group_names[group_name][0] for group_name in rejected])
+        snapshot = await database_sync_to_async(Watcher.get_snapshot)([
+            destructed_ref
+            for group_name, (_, destructed_ref) in group_names.items()
+            if group_name in self.subscriptions
+        ])
+        for message in snapshot:
+            ref, _ = group_names[message["group_name"]]
+            if message["seq"] and message["seq"] == ref.get("seq"):
+                # the client resumed already up to date
+                continue
+            await self.send_update(message)
+
+    async def unsubscribe(self, refs) -> None:
+        """
+        unsubscribe refs
+        """
+        try:
+            group_names = Watcher.build_group_names(refs)
+        except ValueError as error:
+            await self.send_error(str(error), refs if isinstance(refs, list) else [])
+            return
+        subscribed = [group_name
+                      for group_name in group_names
+                      if group_name in self.subscriptions]
+        self.subscriptions.difference_update(subscribed)
+        SUBSCRIPTIONS_ACTIVE.dec(len(subscribed))
+        track_groups(subscribed, -1)
+        await asyncio.gather(*[
+            self.channel_layer.group_discard(group_name, self.channel_name)
+            for group_name in subscribed
+        ])
+
+    async def send_update(self, message: Dict) -> None:
+        """
+        send update, batched when the binary subprotocol is used
+        """
+        MESSAGES_SENT_TOTAL.inc()
+        if not self.binary:
+            await self.send_json(message)
+            return
+        self.pending_updates.append(message)
+        if settings.WATCHER_BINARY_FLUSH_INTERVAL <= 0:
+            await self.flush_updates()
+        elif self.flush_task is None:
+            self.flush_task = asyncio.create_task(self.flush_updates_later())
+
+    async def flush_updates_later(self) -> None:
+        """
+        flush updates after the flush interval
+        """
+        await asyncio.sleep(settings.WATCHER_BINARY_FLUSH_INTERVAL)
+        self.flush_task = None
+        await self.flush_updates()
+
+    async def flush_updates(self) -> None:
+        """
+        flush pending updates
+        """
+        pending, self.pending_updates = self.pending_updates, []
+        frames, unpacked = pack_messages(pending)
+        for frame in frames:
+            await self.send(bytes_data=frame)
+        for message in unpacked:
+            await self.send_json(message)
 
-    def posts_likes_count(self, data: Dict) -> None:
+    async def dispatch(self, message):
         """
-        type: posts.likes_count
+        dispatch watched attributes messages to send_update
         """
-        self.send_json(data)
+        if message["type"] in Watcher.registry:
+            await self.send_update(message)
+            return
+        await super().dispatch(message)
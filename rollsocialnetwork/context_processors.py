@@ -1,21 +1,32 @@
 """
 rollsocialnetwork context processors
+
+values are lazy and memoized per request, templates not using them
+do not query
 """
 from django.conf import settings
 from django.contrib.sites.models import Site
-from .utils import get_popular_rolls
+from .sites import site_registry
+from .utils import (
+    get_popular_rolls,
+    request_memoized,
+)
 
-def home_site(request):
+def get_home_site():
     """
-    adds home_site and is_home_site
+    get home site
     """
-    site = None
     try:
-        site = Site.objects.get(id=settings.HOME_SITE_ID)
+        return site_registry.get(settings.HOME_SITE_ID)
     except Site.DoesNotExist:
-        pass
+        return None
+
+def home_site(request):
+    """
+    adds home_site and is_home_site
+    """
     return {
-        "home_site": site,
+        "home_site": request_memoized(request, "home_site", get_home_site),
         "is_home_site": request.site.id == settings.HOME_SITE_ID
     }
 
@@ -25,6 +36,8 @@ def another_rolls(request):
     """
     if not request.user.is_authenticated:
         return {"another_rolls": []}
-    qs = Site.objects.exclude(id__in=[settings.HOME_SITE_ID,
-                                      request.site.id]).filter(profiles__user=request.user)
-    return {"another_rolls": get_popular_rolls(qs)}
+    def get_another_rolls():
+        qs = Site.objects.exclude(id__in=[settings.HOME_SITE_ID,
+                                          request.site.id]).filter(profiles__user=request.user)
+        return list(get_popular_rolls(qs))
+    return {"another_rolls": request_memoized(request, "another_rolls", get_another_rolls)}
@@ -0,0 +1,265 @@
+"""
+watcher benchmark command
+"""
+import asyncio
+import time
+import uuid
+from typing import (
+    Dict,
+    List,
+    Optional,
+)
+from asgiref.sync import sync_to_async
+from channels.layers import channel_layers  # type: ignore[import-untyped]
+from channels.testing import WebsocketCommunicator  # type: ignore[import-untyped]
+from django.contrib.auth import get_user_model
+from django.contrib.sites.models import Site
+from django.core.management.base import (
+    BaseCommand,
+    CommandError,
+)
+from django.utils.module_loading import import_string
+from rollsocialnetwork.consumers import WatcherConsumer
+from rollsocialnetwork.social.models import UserProfile
+from rollsocialnetwork.timeline.models import Post
+from rollsocialnetwork.watcher import Watcher
+
+LAYERS = {
+    "memory": "channels.layers.InMemoryChannelLayer",
+    "redis": "channels_redis.core.RedisChannelLayer",
+}
+
+def percentile(values: List[float], q: float) -> float:
+    """
+    nearest-rank percentile of sorted values
+    """
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, round(q / 100 * len(values)) - 1))
+    return values[index]
+
+class Command(BaseCommand):
+    """
+    measure watcher fan-out: N subscribers across M posts receiving like bursts
+    """
+    help = ("Benchmark WatcherConsumer fan-out with in-process websockets. Creates a "
+            "throwaway roll, users and posts in the configured database and deletes "
+            "them at the end.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--subscribers",
+                            type=int,
+                            default=1000,
+                            help="number of websockets, spread across the posts")
+        parser.add_argument("--posts",
+                            type=int,
+                            default=10,
+                            help="number of watched posts")
+        parser.add_argument("--bursts",
+                            type=int,
+                            default=20,
+                            help="number of like bursts, round robin across the posts")
+        parser.add_argument("--burst-size",
+                            type=int,
+                            default=10,
+                            help="number of like_dislike calls per burst")
+        parser.add_argument("--layer",
+                            choices=sorted(LAYERS),
+                            action="append",
+                            dest="layers",
+                            help="channel layer to benchmark, all when omitted")
+        parser.add_argument("--redis-url",
+                            default="redis://localhost:6379/0",
+                            help="redis url of the redis channel layer")
+        parser.add_argument("--batch-size",
+                            type=int,
+                            default=200,
+                            help="number of websockets opened concurrently")
+        parser.add_argument("--timeout",
+                            type=float,
+                            default=10,
+                            help="seconds to wait for each delivery")
+
+    def create_fixtures(self, posts_count: int, users_count: int):
+        """
+        create benchmark roll, user profiles and posts
+        """
+        name = f"watcher-benchmark-{uuid.uuid4().hex[:8]}"
+        site = Site.objects.create(domain=f"{name}.invalid", name=name)
+        user_model = get_user_model()
+        users = [user_model.objects.create(username=f"{name}-{index}")
+                 for index in range(users_count)]
+        user_profiles = [UserProfile.objects.create(username=f"user-{index}",  # type: ignore[misc]
+                                                    user=user,
+                                                    site=site)
+                         for index, user in enumerate(users)]
+        posts = [Post.objects.create(user_profile=user_profiles[0])
+                 for _ in range(posts_count)]
+        return site, users, user_profiles, posts
+
+    def delete_fixtures(self, site, users) -> None:
+        """
+        delete benchmark fixtures, profiles, posts and likes cascade
+        """
+        site.delete()
+        get_user_model().objects.filter(pk__in=[user.pk for user in users]).delete()
+
+    def make_layer(self, name: str, redis_url: str):
+        """
+        make channel layer, None when unavailable
+        """
+        try:
+            layer_class = import_string(LAYERS[name])
+        except ImportError:
+            self.stderr.write(f"{name}: {LAYERS[name]} is not installed, skipped")
+            return None
+        if name == "redis":
+            return layer_class(hosts=[redis_url])
+        return layer_class()
+
+    async def subscribe(self, post_pk: int, timeout: float) -> WebsocketCommunicator:
+        """
+        open a websocket subscribed to the post likes count
+        """
+        communicator = WebsocketCommunicator(WatcherConsumer.as_asgi(), "/ws/watcher/")
+        connected, _ = await communicator.connect(timeout=timeout)
+        if not connected:
+            raise CommandError("websocket connection refused")
+        await communicator.send_json_to({
+            "subscribe": [{"model": "posts", "attr": "likes_count", "pk": post_pk}]
+        })
+        # snapshot of the current value
+        await communicator.receive_json_from(timeout=timeout)
+        return communicator
+
+    async def wait_value(self,
+                         communicator: WebsocketCommunicator,
+                         likes_count: int,
+                         started_at: float,
+                         timeout: float) -> Optional[float]:
+        """
+        wait the likes count, returns the latency or None on timeout
+        """
+        try:
+            while True:
+                message = await communicator.receive_json_from(timeout=timeout)
+                if message.get("likes_count") == likes_count:
+                    return time.perf_counter() - started_at
+        except asyncio.TimeoutError:
+            return None
+
+    async def open_subscribers(self, posts, options) -> Dict[int, List[WebsocketCommunicator]]:
+        """
+        open subscribers in batches, spread across the posts
+        """
+        subscribers: Dict[int, List[WebsocketCommunicator]] = {post.pk: [] for post in posts}
+        for offset in range(0, options["subscribers"], options["batch_size"]):
+            indexes = range(offset, min(offset + options["batch_size"], options["subscribers"]))
+            communicators = await asyncio.gather(*[
+                self.subscribe(posts[index % len(posts)].pk, options["timeout"])
+                for index in indexes
+            ])
+            for index, communicator in zip(indexes, communicators):
+                subscribers[posts[index % len(posts)].pk].append(communicator)
+        return subscribers
+
+    async def run_burst(self,
+                        post: Post,
+                        user_profiles: List[UserProfile],
+                        communicators: List[WebsocketCommunicator],
+                        timeout: float) -> List[Optional[float]]:
+        """
+        like the post once per user profile, returns the subscribers latencies
+        """
+        started_at = time.perf_counter()
+        for user_profile in user_profiles:
+            await sync_to_async(post.like_dislike)(user_profile)
+        likes_count = await sync_to_async(
+            Post.objects.filter(pk=post.pk).values_list("likes_count", flat=True).get
+        )()
+        return await asyncio.gather(*[
+            self.wait_value(communicator, likes_count, started_at, timeout)
+            for communicator in communicators
+        ])
+
+    async def run(self, posts, user_profiles, options) -> Dict:
+        """
+        run benchmark on the current channel layer
+        """
+        started_at = time.perf_counter()
+        subscribers = await self.open_subscribers(posts, options)
+        connect_seconds = time.perf_counter() - started_at
+        latencies: List[float] = []
+        missed = 0
+        started_at = time.perf_counter()
+        for burst in range(options["bursts"]):
+            post = posts[burst % len(posts)]
+            results = await self.run_burst(post,
+                                           user_profiles,
+                                           subscribers[post.pk],
+                                           options["timeout"])
+            latencies += [latency for latency in results if latency is not None]
+            missed += sum(1 for latency in results if latency is None)
+        elapsed_seconds = time.perf_counter() - started_at
+        await asyncio.gather(*[
+            communicator.disconnect(timeout=options["timeout"])
+            for communicators in subscribers.values()
+            for communicator in communicators
+            # timed out receives cancel the consumer
+            if not communicator.future.done()
+        ])
+        latencies.sort()
+        return {
+            "connect_seconds": connect_seconds,
+            "elapsed_seconds": elapsed_seconds,
+            "likes": options["bursts"] * len(user_profiles),
+            "delivered": len(latencies),
+            "missed": missed,
+            "latencies": latencies,
+        }
+
+    def report(self, name: str, result: Dict) -> None:
+        """
+        report layer result
+        """
+        latencies = result["latencies"]
+        elapsed_seconds = result["elapsed_seconds"] or 1e-9
+        self.stdout.write(f"{name}: subscribers connected in {result['connect_seconds']:.2f}s")
+        self.stdout.write(f"{name}: {result['likes']} likes, "
+                          f"{result['likes'] / elapsed_seconds:.1f} likes/s")
+        self.stdout.write(f"{name}: {result['delivered']} deliveries, "
+                          f"{result['missed']} missed, "
+                          f"{result['delivered'] / elapsed_seconds:.1f} deliveries/s")
+        self.stdout.write(f"{name}: latency ms "
+                          f"p50={percentile(latencies, 50) * 1000:.1f} "
+                          f"p95={percentile(latencies, 95) * 1000:.1f} "
+                          f"p99={percentile(latencies, 99) * 1000:.1f} "
+                          f"max={percentile(latencies, 100) * 1000:.1f}")
+
+    def handle(self, *args, **options):
+        for option in ("subscribers", "posts", "bursts", "burst_size", "batch_size"):
+            if options[option] < 1:
+                raise CommandError(f"--{option.replace('_', '-')} must be greater than zero")
+        site, users, user_profiles, posts = self.create_fixtures(options["posts"],
+                                                                 options["burst_size"])
+        try:
+            for name in options["layers"] or sorted(LAYERS):
+                layer = self.make_layer(name, options["redis_url"])
+                if layer is None:
+                    continue
+                previous_layer = channel_layers.set("default", layer)
+                try:
+                    result = asyncio.run(self.run(posts, user_profiles, options))
+                except OSError as error:
+                    self.stderr.write(f"{name}: channel layer unavailable, skipped ({error})")
+                    continue
+                finally:
+                    # coalesced notifications go to the benchmarked layer
+                    Watcher.get_notifier().flush()
+                    if previous_layer is None:
+                        channel_layers.backends.pop("default", None)
+                    else:
+                        channel_layers.set("default", previous_layer)
+                self.report(name, result)
+        finally:
+            self.delete_fixtures(site, users)
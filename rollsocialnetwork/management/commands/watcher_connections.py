@@ -0,0 +1,134 @@
+"""
+watcher connections command
+"""
+import asyncio
+import resource
+import time
+from django.core.management.base import (
+    BaseCommand,
+    CommandError,
+)
+from channels.layers import get_channel_layer  # type: ignore[import-untyped]
+from channels.testing import WebsocketCommunicator  # type: ignore[import-untyped]
+from rollsocialnetwork.consumers import WatcherConsumer
+from rollsocialnetwork.watcher import Watcher
+
+# likes count of the broadcast, never a stored value, so the snapshot sent
+# on subscribe is not taken for the broadcast
+BROADCAST_LIKES_COUNT = -1
+
+class Command(BaseCommand):
+    """
+    open idle watcher connections in one process and report what they cost
+    """
+    help = "Load test: hold N idle watcher websockets in one worker and broadcast to them."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--connections",
+                            type=int,
+                            default=1000,
+                            help="number of websockets to open")
+        parser.add_argument("--batch-size",
+                            type=int,
+                            default=100,
+                            help="number of websockets opened concurrently")
+        parser.add_argument("--post",
+                            type=int,
+                            default=1,
+                            help="post pk every connection subscribes to")
+        parser.add_argument("--timeout",
+                            type=float,
+                            default=5,
+                            help="seconds to wait for each connection and message")
+
+    async def open_connection(self, application, ref, timeout):
+        """
+        open and subscribe a connection
+        """
+        communicator = WebsocketCommunicator(application, "/ws/watcher/")
+        connected, _ = await communicator.connect(timeout=timeout)
+        if not connected:
+            raise CommandError("websocket connection refused")
+        await communicator.send_json_to({"ref": ref})
+        return communicator
+
+    async def receive_broadcast(self, communicator, timeout) -> bool:
+        """
+        receive messages until the broadcast, False on timeout
+        """
+        try:
+            while True:
+                message = await communicator.receive_json_from(timeout=timeout)
+                if message.get("likes_count") == BROADCAST_LIKES_COUNT:
+                    return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def open_connections(self, connections, batch_size, post_pk, timeout):
+        """
+        open and subscribe connections in batches
+        """
+        application = WatcherConsumer.as_asgi()
+        ref = {"model": "posts", "attr": "likes_count", "pk": post_pk}
+        communicators = []
+        for offset in range(0, connections, batch_size):
+            communicators += await asyncio.gather(*[
+                self.open_connection(application, ref, timeout)
+                for _ in range(min(batch_size, connections - offset))
+            ])
+        # let the consumers process their subscriptions
+        await asyncio.sleep(0.1)
+        return communicators
+
+    async def broadcast(self, communicators, post_pk, timeout) -> int:
+        """
+        broadcast to the post group, returns the number of deliveries
+        """
+        message = Watcher.build_message("posts",
+                                        "likes_count",
+                                        BROADCAST_LIKES_COUNT,
+                                        pk=post_pk)
+        await get_channel_layer().group_send(message["group_name"], message)
+        received = await asyncio.gather(*[
+            self.receive_broadcast(communicator, timeout)
+            for communicator in communicators
+        ])
+        return sum(received)
+
+    async def run(self, connections, batch_size, post_pk, timeout):
+        """
+        run load test
+        """
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        started_at = time.perf_counter()
+        communicators = await self.open_connections(connections, batch_size, post_pk, timeout)
+        connect_seconds = time.perf_counter() - started_at
+        rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        started_at = time.perf_counter()
+        delivered = await self.broadcast(communicators, post_pk, timeout)
+        broadcast_seconds = time.perf_counter() - started_at
+        await asyncio.gather(*[
+            communicator.disconnect(timeout=timeout)
+            for communicator in communicators
+            # timed out receives cancel the consumer
+            if not communicator.future.done()
+        ])
+        return connect_seconds, broadcast_seconds, delivered, rss_after - rss_before
+
+    def handle(self, *args, **options):
+        connections = options["connections"]
+        batch_size = options["batch_size"]
+        if connections < 1:
+            raise CommandError("--connections must be greater than zero")
+        if batch_size < 1:
+            raise CommandError("--batch-size must be greater than zero")
+        connect_seconds, broadcast_seconds, delivered, rss_kb = asyncio.run(
+            self.run(connections, batch_size, options["post"], options["timeout"])
+        )
+        self.stdout.write(f"{connections} connections opened in {connect_seconds:.2f}s")
+        self.stdout.write(f"max rss growth: {rss_kb} KiB "
+                          f"({rss_kb / connections:.1f} KiB per connection)")
+        self.stdout.write(f"broadcast delivered to {delivered}/{connections} "
+                          f"in {broadcast_seconds * 1000:.1f}ms")
+        if delivered != connections:
+            raise CommandError(f"{connections - delivered} connections missed the broadcast")
@@ -0,0 +1,182 @@
+"""
+rollsocialnetwork metrics
+
+In-process counters, gauges and histograms rendered in the Prometheus text
+exposition format. Values are kept per process, so every worker is scraped
+on its own.
+"""
+import bisect
+import threading
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Sequence,
+)
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+def render_histogram(name: str,
+                     help_text: str,
+                     buckets: Sequence[float],
+                     counts: Sequence[int],
+                     total: float) -> List[str]:
+    """
+    render histogram lines, counts are per bucket plus the +Inf one
+    """
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    cumulative = 0
+    for bucket, count in zip(list(buckets) + ["+Inf"], counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{{le="{bucket}"}} {cumulative}')
+    lines.append(f"{name}_sum {total}")
+    lines.append(f"{name}_count {cumulative}")
+    return lines
+
+def observe_buckets(buckets: Sequence[float], values: Iterable[float]) -> List[int]:
+    """
+    count values per bucket plus the +Inf one
+    """
+    counts = [0] * (len(buckets) + 1)
+    for value in values:
+        counts[bisect.bisect_left(buckets, value)] += 1
+    return counts
+
+class Counter:
+    """
+    counter metric
+    """
+
+    def __init__(self, name: str, help_text: str) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, value: float = 1) -> None:
+        """
+        increment
+        """
+        with self._lock:
+            self.value += value
+
+    def render(self) -> List[str]:
+        """
+        render lines
+        """
+        return [f"# HELP {self.name} {self.help_text}",
+                f"# TYPE {self.name} counter",
+                f"{self.name} {self.value}"]
+
+class Gauge(Counter):
+    """
+    gauge metric
+    """
+
+    def dec(self, value: float = 1) -> None:
+        """
+        decrement
+        """
+        self.inc(-value)
+
+    def set(self, value: float) -> None:
+        """
+        set
+        """
+        with self._lock:
+            self.value = value
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help_text}",
+                f"# TYPE {self.name} gauge",
+                f"{self.name} {self.value}"]
+
+class Histogram:
+    """
+    histogram metric
+    """
+
+    def __init__(self,
+                 name: str,
+                 help_text: str,
+                 buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        """
+        observe value
+        """
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.total += value
+
+    def render(self) -> List[str]:
+        """
+        render lines
+        """
+        with self._lock:
+            counts = list(self.counts)
+            total = self.total
+        return render_histogram(self.name, self.help_text, self.buckets, counts, total)
+
+class Registry:
+    """
+    metrics registry
+    """
+
+    def __init__(self) -> None:
+        self.metrics: Dict[str, (Counter | Histogram)] = {}
+        self.collectors: List[Callable[[], List[str]]] = []
+
+    def register(self, metric):
+        """
+        register metric, returns the registered one when the name exists
+        """
+        return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        """
+        get or register counter
+        """
+        return self.register(Counter(name, help_text))
+
+    def gauge(self, name: str, help_text: str) -> Gauge:
+        """
+        get or register gauge
+        """
+        return self.register(Gauge(name, help_text))
+
+    def histogram(self,
+                  name: str,
+                  help_text: str,
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        """
+        get or register histogram
+        """
+        return self.register(Histogram(name, help_text, buckets))
+
+    def collector(self, collect: Callable[[], List[str]]) -> Callable[[], List[str]]:
+        """
+        register collector decorator, collectors render lines at scrape time
+        """
+        self.collectors.append(collect)
+        return collect
+
+    def render(self) -> str:
+        """
+        render metrics in the Prometheus text format
+        """
+        lines = []
+        for metric in self.metrics.values():
+            lines += metric.render()
+        for collect in self.collectors:
+            lines += collect()
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
@@ -0,0 +1,15 @@
+"""
+rollsocialnetwork middlewares
+"""
+from django.utils.deprecation import MiddlewareMixin
+from .sites import site_registry
+
+class CurrentSiteMiddleware(MiddlewareMixin):  # pylint: disable=R0903
+    """
+    Middleware that sets `site` attribute to request object, from the site registry.
+    """
+    def process_request(self, request):
+        """
+        process request
+        """
+        request.site = site_registry.get_current(request)
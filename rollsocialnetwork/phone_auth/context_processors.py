@@ -1,6 +1,7 @@
 """
 phone auth context processors
 """
+from rollsocialnetwork.utils import request_memoized
 from .models import OTPSecret
 
 def otp_secret_validated(request):
@@ -9,6 +10,10 @@ def otp_secret_validated(request):
     """
     if not request.user.is_authenticated:
         return {"otp_secret_validated": False}
-    qs = OTPSecret.objects.filter(user=request.user,
-                                  valid_at__isnull=False)
-    return {"otp_secret_validated": qs.exists()}
+    return {
+        "otp_secret_validated": request_memoized(
+            request,
+            "otp_secret_validated",
+            lambda: OTPSecret.is_validated(request.user)
+        )
+    }
@@ -6,7 +6,12 @@ from typing import (
     Tuple,
 )
 from pyotp.totp import TOTP
-from django.db import models
+from django.core.cache import cache
+from django.db import (
+    models,
+    transaction,
+)
+from django.dispatch import receiver
 from django.contrib.auth import get_user_model
 from django.conf import settings
 from django.utils import timezone
@@ -15,7 +20,7 @@ from django.contrib.auth.models import (  # pylint: disable=imported-auth-user
     AnonymousUser,
     User,
 )
-from django.contrib.sites.models import Site
+from rollsocialnetwork.sites import site_registry
 from .sms_gateways import get_sms_gateway
 from .utils import (
     fill_code,
@@ -24,6 +29,8 @@ from .utils import (
     fill_otp_secret_value,
 )
 
+OTP_SECRET_VALIDATED_CACHE_KEY = "phone-auth:otp-secret-validated:{user_id}"
+
 class VerificationCode(models.Model):
     """
     Verification Code model
@@ -95,6 +102,33 @@ class OTPSecret(models.Model):
         return OTPSecret.objects.filter(user__username=phone_number,
                                         valid_at__isnull=False).exists()
 
+    @classmethod
+    def is_validated(cls, user: User) -> bool:
+        """
+        user has a validated OTP secret, cached per user
+
+        a not validated state is cached for OTP_SECRET_NOT_VALIDATED_CACHE_TIMEOUT
+        seconds only, a concurrent request that read before the validation
+        committed can cache it after the validation forgot it
+        """
+        key = OTP_SECRET_VALIDATED_CACHE_KEY.format(user_id=user.pk)
+        validated = cache.get(key)
+        if validated is None:
+            validated = cls.objects.filter(user=user,
+                                           valid_at__isnull=False).exists()
+            cache.set(key,
+                      validated,
+                      settings.OTP_SECRET_VALIDATED_CACHE_TIMEOUT if validated
+                      else settings.OTP_SECRET_NOT_VALIDATED_CACHE_TIMEOUT)
+        return validated
+
+    @classmethod
+    def forget_validated(cls, user_id: int) -> None:
+        """
+        forget cached validated state
+        """
+        cache.delete(OTP_SECRET_VALIDATED_CACHE_KEY.format(user_id=user_id))
+
     @classmethod
     def create(cls, user: User) -> "OTPSecret":
         """
@@ -140,7 +174,7 @@ class OTPSecret(models.Model):
         """
         uri for 2FA authentication apps
         """
-        home_site = Site.objects.get(id=settings.HOME_SITE_ID)
+        home_site = site_registry.get(settings.HOME_SITE_ID)
         return self.totp.provisioning_uri(name=self.user.username,  # type: ignore[attr-defined]  # pylint: disable=no-member
                                           issuer_name=home_site.name)
 
@@ -151,3 +185,12 @@ class OTPSecret(models.Model):
         self.valid_at = timezone.now()
         if force_save:
             self.save()
+
+@receiver([models.signals.post_save,
+           models.signals.post_delete], sender=OTPSecret)
+def forget_otp_secret_validated(instance, **kwargs):
+    """
+    forget cached validated state, again once committed
+    """
+    OTPSecret.forget_validated(instance.user_id)
+    transaction.on_commit(lambda: OTPSecret.forget_validated(instance.user_id))
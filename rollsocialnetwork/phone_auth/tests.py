@@ -9,6 +9,8 @@ from django.test import (
     override_settings
 )
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
 from django.utils import timezone
 from django.forms import ValidationError
 from phonenumber_field.phonenumber import PhoneNumber  # type: ignore[import-untyped]
@@ -16,11 +18,13 @@ from phonenumbers import region_code_for_country_code
 from rollsocialnetwork.phone_auth.views import LoginView, ValidateOTPSecretView
 from rollsocialnetwork.tests_factory import SiteFactory, UserFactory
 from rollsocialnetwork.tests_fake import fake
+from .context_processors import otp_secret_validated
 from .utils import (
     get_or_create_user,
     normalize_phone_number,
 )
 from .models import (
+    OTP_SECRET_VALIDATED_CACHE_KEY,
     VerificationCode,
     OTPSecret,
 )
@@ -417,3 +421,63 @@ class ValidateOTPSecretViewTestCase(TestCase):
         result = ValidateOTPSecretView.as_view()(request)
         self.assertEqual(result.status_code, 302)
         validate_mock.assert_called()
+
+class OTPSecretValidatedContextProcessorTestCase(TestCase):
+    """
+    otp_secret_validated context processor test case
+    """
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.otp_secret_factory = OTPSecretFactory()
+        cache.clear()
+
+    def get_validated(self, user):
+        """
+        get otp_secret_validated of a new request
+        """
+        request = self.factory.get("/")
+        request.user = user
+        return otp_secret_validated(request)["otp_secret_validated"]
+
+    def test_anonymous(self):
+        """
+        test anonymous
+        """
+        with self.assertNumQueries(0):
+            self.assertFalse(self.get_validated(AnonymousUser()))
+
+    def test_lazy_and_cached(self):
+        """
+        test validated is queried on use, then read from cache
+        """
+        otp_secret = self.otp_secret_factory.create_otp_secret()
+        with self.assertNumQueries(0):
+            validated = self.get_validated(otp_secret.user)
+        with self.assertNumQueries(1):
+            self.assertFalse(validated)
+        with self.assertNumQueries(0):
+            self.assertFalse(self.get_validated(otp_secret.user))
+
+    def test_invalidated_on_validate(self):
+        """
+        test cached state is forgotten on validate
+        """
+        otp_secret = self.otp_secret_factory.create_otp_secret()
+        self.assertFalse(self.get_validated(otp_secret.user))
+        otp_secret.validate()
+        self.assertTrue(self.get_validated(otp_secret.user))
+
+    def test_not_validated_cache_timeout(self):
+        """
+        test not validated state is cached for a short timeout only
+        """
+        otp_secret = self.otp_secret_factory.create_otp_secret()
+        with override_settings(OTP_SECRET_NOT_VALIDATED_CACHE_TIMEOUT=5), \
+                mock.patch.object(cache, "set", wraps=cache.set) as set_mock:
+            self.assertFalse(OTPSecret.is_validated(otp_secret.user))
+        set_mock.assert_called_once_with(
+            OTP_SECRET_VALIDATED_CACHE_KEY.format(user_id=otp_secret.user.pk),
+            False,
+            5
+        )
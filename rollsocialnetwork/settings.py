@@ -61,7 +61,7 @@ MIDDLEWARE = [
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
-    "django.contrib.sites.middleware.CurrentSiteMiddleware",
+    "rollsocialnetwork.middleware.CurrentSiteMiddleware",
     "rollsocialnetwork.social.middleware.CurrentUserProfileMiddleware",
     "csp.middleware.CSPMiddleware",
 ]
@@ -188,6 +188,11 @@ CORS_ALLOW_HEADERS = [
     *corsheaders.defaults.default_headers,
     "action-component",
 ]
+CORS_EXPOSE_HEADERS = [
+    "likes-count",
+    "timeline-slice",
+    "timeline-has-more",
+]
 CORS_ALLOW_CREDENTIALS = True
 SECURE_CROSS_ORIGIN_OPENER_POLICY = "unsafe-none"
 SESSION_COOKIE_DOMAIN = config("SESSION_COOKIE_DOMAIN",
@@ -237,6 +242,17 @@ CHANNEL_LAYERS = {
                          cast=json.loads)
     }
 }
+# LocMemCache is per process, run several workers with a shared cache (e.g.
+# django.core.cache.backends.redis.RedisCache), cached Site registry versions
+# and timeline marks are invalidated through it
+CACHES = {
+    "default": {
+        "BACKEND": config("CACHES_DEFAULT_BACKEND",
+                          default="django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": config("CACHES_DEFAULT_LOCATION",
+                           default=""),
+    }
+}
 SUBDOMAIN_BASE = config("SUBDOMAIN_BASE",
                         default="roll.local")
 CSRF_TRUSTED_ORIGINS = config("CSRF_TRUSTED_ORIGINS",
@@ -247,6 +263,56 @@ OVERRIDE_SCHEME = config("OVERRIDE_SCHEME",
 HOT_POSTS_SLICE = config("HOT_POSTS_SLICE",
                          default=12,
                          cast=int)
+HOT_SCORE_HALF_LIFE = config("HOT_SCORE_HALF_LIFE",
+                             default=12.0,
+                             cast=float)
+HOT_SCORE_POST_WEIGHT = config("HOT_SCORE_POST_WEIGHT",
+                               default=1.0,
+                               cast=float)
+HOT_SCORE_LIKE_WEIGHT = config("HOT_SCORE_LIKE_WEIGHT",
+                               default=0.25,
+                               cast=float)
+TIMELINE_FEED_MAX_LENGTH = config("TIMELINE_FEED_MAX_LENGTH",
+                                  default=1000,
+                                  cast=int)
+TIMELINE_LATEST_POST_PK_CACHE_TIMEOUT = config("TIMELINE_LATEST_POST_PK_CACHE_TIMEOUT",
+                                               default=60,
+                                               cast=int)
+WATCHER_NOTIFY_WINDOW = config("WATCHER_NOTIFY_WINDOW",
+                               default=0.25,
+                               cast=float)
+WATCHER_MAX_SUBSCRIPTIONS = config("WATCHER_MAX_SUBSCRIPTIONS",
+                                   default=200,
+                                   cast=int)
+WATCHER_VALUE_TIMEOUT = config("WATCHER_VALUE_TIMEOUT",
+                               default=86400,
+                               cast=int)
+WATCHER_BINARY_FLUSH_INTERVAL = config("WATCHER_BINARY_FLUSH_INTERVAL",
+                                       default=0.05,
+                                       cast=float)
+WATCHER_SSE_HEARTBEAT = config("WATCHER_SSE_HEARTBEAT",
+                               default=15.0,
+                               cast=float)
+WATCHER_SSE_RETRY = config("WATCHER_SSE_RETRY",
+                           default=3000,
+                           cast=int)
+WATCHER_METRICS_TOKEN = config("WATCHER_METRICS_TOKEN",
+                               default="")
+USER_PROFILE_CACHE_TIMEOUT = config("USER_PROFILE_CACHE_TIMEOUT",
+                                    default=3600,
+                                    cast=int)
+USER_PROFILE_MISSING_CACHE_TIMEOUT = config("USER_PROFILE_MISSING_CACHE_TIMEOUT",
+                                            default=5,
+                                            cast=int)
+OTP_SECRET_VALIDATED_CACHE_TIMEOUT = config("OTP_SECRET_VALIDATED_CACHE_TIMEOUT",
+                                            default=3600,
+                                            cast=int)
+OTP_SECRET_NOT_VALIDATED_CACHE_TIMEOUT = config("OTP_SECRET_NOT_VALIDATED_CACHE_TIMEOUT",
+                                                default=5,
+                                                cast=int)
+SITE_REGISTRY_CHECK_INTERVAL = config("SITE_REGISTRY_CHECK_INTERVAL",
+                                      default=5.0,
+                                      cast=float)
 OAUTH_PKCE_REQUIRED_LIST = config("OAUTH_PKCE_REQUIRED_LIST",
                                  default=None,
                                  cast=(lambda value: value if value is None else value.split()))
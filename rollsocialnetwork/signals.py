@@ -0,0 +1,20 @@
+"""
+rollsocialnetwork signals
+"""
+from django.contrib.sites.models import Site
+from django.db import (
+    models,
+    transaction,
+)
+from django.dispatch import receiver
+from .sites import site_registry
+
+@receiver([models.signals.post_save,
+           models.signals.post_delete], sender=Site)
+def invalidate_site_registry(**kwargs):
+    """
+    invalidate site registry, again once committed so a worker can not
+    reload the previous state
+    """
+    site_registry.invalidate()
+    transaction.on_commit(site_registry.invalidate)
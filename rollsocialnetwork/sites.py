@@ -0,0 +1,147 @@
+"""
+rollsocialnetwork sites
+
+In-process registry of Site rows by id and domain. It is loaded with one
+query and reloaded when the registry version, kept in the shared cache and
+renewed on every Site save or delete, changes. Workers check the version at
+most every SITE_REGISTRY_CHECK_INTERVAL seconds, and reload once on a
+lookup miss, for a site created or edited meanwhile.
+
+The version reaches other workers only through a cache shared by them
+(e.g. CACHES_DEFAULT_BACKEND=django.core.cache.backends.redis.RedisCache),
+with the per-process LocMemCache default each worker only sees its own
+Site changes until a lookup miss.
+"""
+import threading
+import time
+from typing import (
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
+from django.conf import settings
+from django.contrib.sites.models import Site
+from django.core.cache import cache
+from django.http import HttpRequest
+from django.http.request import split_domain_port
+
+SITE_REGISTRY_VERSION_CACHE_KEY = "sites:registry:version"
+
+class SiteRegistry:
+    """
+    site registry
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._by_id: Optional[Dict[int, Site]] = None
+        self._by_domain: Dict[str, Site] = {}
+        self._version: Optional[int] = None
+        self._checked_at = 0.0
+
+    def get_version(self) -> int:
+        """
+        get shared registry version
+        """
+        version = cache.get(SITE_REGISTRY_VERSION_CACHE_KEY)
+        if version is None:
+            cache.add(SITE_REGISTRY_VERSION_CACHE_KEY, time.time_ns(), None)
+            version = cache.get(SITE_REGISTRY_VERSION_CACHE_KEY)
+        return version
+
+    def load_maps(self, reload: bool = False) -> Tuple[Dict[int, Site], Dict[str, Site]]:
+        """
+        load sites by id and by domain maps, reloading them when the version
+        changed or when forced. The maps are replaced, never mutated, so a
+        returned snapshot is consistent
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._by_id is not None and not reload \
+                and now - self._checked_at < settings.SITE_REGISTRY_CHECK_INTERVAL:
+                return self._by_id, self._by_domain
+            version = self.get_version()
+            if reload or self._by_id is None or version != self._version:
+                sites = list(Site.objects.order_by("pk"))
+                self._by_id = {site.pk: site for site in sites}
+                self._by_domain = {site.domain.lower(): site  # type: ignore[union-attr]
+                                   for site in sites}
+                self._version = version
+            self._checked_at = now
+            return self._by_id, self._by_domain
+
+    def load(self) -> Dict[int, Site]:
+        """
+        load sites, reloading them when the version changed
+        """
+        by_id, _ = self.load_maps()
+        return by_id
+
+    def find(self, lookup: Callable[[Dict[int, Site], Dict[str, Site]], Optional[Site]]) \
+            -> Optional[Site]:
+        """
+        find a site with lookup on a maps snapshot, reloading them once on a miss
+        """
+        site = lookup(*self.load_maps())
+        if site is None:
+            site = lookup(*self.load_maps(reload=True))
+        return site
+
+    def invalidate(self) -> None:
+        """
+        invalidate the registry of every worker
+        """
+        cache.set(SITE_REGISTRY_VERSION_CACHE_KEY, time.time_ns(), None)
+        with self._lock:
+            self._by_id = None
+            self._by_domain = {}
+
+    def __contains__(self, pk) -> bool:
+        return pk in self.load()
+
+    def all(self) -> List[Site]:
+        """
+        all sites ordered by pk
+        """
+        return list(self.load().values())
+
+    def get(self, pk: int) -> Site:
+        """
+        get site by pk, raises Site.DoesNotExist
+        """
+        site = self.find(lambda by_id, _by_domain: by_id.get(pk))
+        if site is None:
+            raise Site.DoesNotExist(f"site {pk} does not exist")
+        return site
+
+    def get_by_domain(self, domain: str) -> Site:
+        """
+        get site by domain, raises Site.DoesNotExist
+        """
+        site = self.find(lambda _by_id, by_domain: by_domain.get(domain.lower()))
+        if site is None:
+            raise Site.DoesNotExist(f"site {domain} does not exist")
+        return site
+
+    def get_by_request(self, request: HttpRequest) -> Site:
+        """
+        get site of request host, with or without port
+        """
+        host = request.get_host().lower()
+        domain, _ = split_domain_port(host)
+        site = self.find(lambda _by_id, by_domain: by_domain.get(host) or by_domain.get(domain))
+        if site is None:
+            raise Site.DoesNotExist(f"site {host} does not exist")
+        return site
+
+    def get_current(self, request: HttpRequest) -> Site:
+        """
+        get current site, the SITE_ID one when set like Site.objects.get_current
+        """
+        if getattr(settings, "SITE_ID", None):
+            return self.get(settings.SITE_ID)
+        return self.get_by_request(request)
+
+site_registry = SiteRegistry()
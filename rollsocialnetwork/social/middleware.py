@@ -1,19 +1,30 @@
 """
 social middlewares
 """
+from typing import Optional
 from django.utils.deprecation import MiddlewareMixin
+from django.utils.functional import SimpleLazyObject
 from rollsocialnetwork.http_request import HttpRequest
 from .models import UserProfile
 
+def get_user_profile(request: HttpRequest) -> Optional[UserProfile]:
+    """
+    get request user profile
+    """
+    if not request.user.is_authenticated:
+        return None
+    return UserProfile.get_cached_user_profile(request.user, request.site)  # type: ignore[arg-type]
+
 class CurrentUserProfileMiddleware(MiddlewareMixin):  # pylint: disable=R0903
     """
     Middleware that sets `user_profile` attribute to request object.
+
+    The user profile is resolved on first access.
     """
     def process_request(self, request: HttpRequest):
         """
         process request
         """
-        if request.user.is_authenticated:
-            request.user_profile = UserProfile.get_user_profile(request.user, request.site)
-        else:
-            request.user_profile = None
+        request.user_profile = SimpleLazyObject(  # type: ignore[assignment]
+            lambda: get_user_profile(request)
+        )
@@ -2,12 +2,22 @@
 social models
 """
 from typing import Optional
-from django.db import models
+from django.conf import settings
+from django.core.cache import cache
+from django.db import (
+    models,
+    transaction,
+)
+from django.dispatch import receiver
 from django.contrib.auth import get_user_model
 from django.contrib.sites.models import Site
 from django.urls import reverse
 from django.contrib.auth.models import User  # pylint: disable=imported-auth-user
 
+USER_PROFILE_CACHE_KEY = "social:user-profile:{user_id}:{site_id}"
+# cached when the user has no profile on the site
+NO_USER_PROFILE = "none"
+
 class UserProfile(models.Model):
     """
     user profile
@@ -42,6 +52,34 @@ class UserProfile(models.Model):
         except cls.DoesNotExist:
             return None
 
+    @classmethod
+    def get_cached_user_profile(cls,
+                                user: User,
+                                site: Site) -> Optional['UserProfile']:
+        """
+        get user profile, cached per user and site
+
+        a missing profile is cached for USER_PROFILE_MISSING_CACHE_TIMEOUT
+        seconds only, a concurrent request that read before the profile
+        creation committed can cache it after the creation forgot it
+        """
+        key = USER_PROFILE_CACHE_KEY.format(user_id=user.pk, site_id=site.pk)
+        user_profile = cache.get(key)
+        if user_profile is None:
+            user_profile = cls.get_user_profile(user, site)
+            if user_profile:
+                cache.set(key, user_profile, settings.USER_PROFILE_CACHE_TIMEOUT)
+            else:
+                cache.set(key, NO_USER_PROFILE, settings.USER_PROFILE_MISSING_CACHE_TIMEOUT)
+        return user_profile if isinstance(user_profile, cls) else None
+
+    @classmethod
+    def forget_cached_user_profile(cls, user_id: int, site_id: int) -> None:
+        """
+        forget cached user profile
+        """
+        cache.delete(USER_PROFILE_CACHE_KEY.format(user_id=user_id, site_id=site_id))
+
     def __str__(self) -> str:
         return f"{self.site}: User Profile @{self.username} ({self.user})"
 
@@ -50,3 +88,14 @@ class UserProfile(models.Model):
         get absolute url
         """
         return reverse("social-user-profile", kwargs={"username": self.username})
+
+@receiver([models.signals.post_save,
+           models.signals.post_delete], sender=UserProfile)
+def forget_cached_user_profile(instance, **kwargs):
+    """
+    forget cached user profile, again once committed so a concurrent
+    request can not cache the previous state
+    """
+    UserProfile.forget_cached_user_profile(instance.user_id, instance.site_id)
+    transaction.on_commit(lambda: UserProfile.forget_cached_user_profile(instance.user_id,
+                                                                         instance.site_id))
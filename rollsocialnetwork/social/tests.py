@@ -4,16 +4,26 @@ social tests
 from unittest import mock
 from django.test import (
     RequestFactory,
-    TestCase
+    TestCase,
+    override_settings
 )
 from django.urls import reverse
 from django.views import View
 from django.contrib.auth.models import AnonymousUser
 from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import BadRequest
 from django.http import HttpResponseRedirect, JsonResponse
-from rollsocialnetwork.tests_factory import UserFactory
+from rollsocialnetwork.tests_factory import (
+    SiteFactory,
+    UserFactory,
+)
 from .context_processors import social
+from .middleware import CurrentUserProfileMiddleware
+from .models import (
+    NO_USER_PROFILE,
+    USER_PROFILE_CACHE_KEY,
+)
 from .mixins import UserProfileRequiredMixin
 from .tests_factory import UserProfileFactory
 
@@ -289,3 +299,75 @@ class UserProfileRequiredMixinTest(TestCase):
             b"""{"message": "denied", "action_message": "do", "action_url": "/login/", \
 "action_component": "popup-opener-callback", "next": "/test/"}"""
         )
+
+class CurrentUserProfileMiddlewareTest(TestCase):
+    """
+    CurrentUserProfileMiddleware test
+    """
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.user_profile_factory = UserProfileFactory()
+        self.middleware = CurrentUserProfileMiddleware(lambda request: None)
+        cache.clear()
+
+    def build_request(self, user, site):
+        """
+        build request through the middleware
+        """
+        request = self.factory.get("/")
+        request.user = user
+        request.site = site
+        self.middleware.process_request(request)
+        return request
+
+    def test_lazy_and_cached(self):
+        """
+        test user profile is resolved on access, then from cache
+        """
+        user_profile = self.user_profile_factory.create_user_profile()
+        with self.assertNumQueries(0):
+            request = self.build_request(user_profile.user, user_profile.site)
+        with self.assertNumQueries(1):
+            self.assertEqual(request.user_profile.pk, user_profile.pk)
+        request = self.build_request(user_profile.user, user_profile.site)
+        with self.assertNumQueries(0):
+            self.assertEqual(request.user_profile.pk, user_profile.pk)
+
+    def test_anonymous(self):
+        """
+        test anonymous user has no user profile
+        """
+        site = SiteFactory().create_site()
+        request = self.build_request(AnonymousUser(), site)
+        with self.assertNumQueries(0):
+            self.assertFalse(request.user_profile)
+
+    def test_no_user_profile_cached_and_invalidated(self):
+        """
+        test missing user profile is cached until a profile is created
+        """
+        user = UserFactory().create_user()
+        site = SiteFactory().create_site()
+        self.assertFalse(self.build_request(user, site).user_profile)
+        with self.assertNumQueries(0):
+            self.assertFalse(self.build_request(user, site).user_profile)
+        user_profile = self.user_profile_factory.create_user_profile(user=user, site=site)
+        self.assertEqual(self.build_request(user, site).user_profile.pk, user_profile.pk)
+        user_profile.delete()
+        self.assertFalse(self.build_request(user, site).user_profile)
+
+    def test_no_user_profile_cache_timeout(self):
+        """
+        test missing user profile is cached for a short timeout only
+        """
+        user = UserFactory().create_user()
+        site = SiteFactory().create_site()
+        with override_settings(USER_PROFILE_MISSING_CACHE_TIMEOUT=5), \
+                mock.patch.object(cache, "set", wraps=cache.set) as set_mock:
+            self.assertFalse(self.build_request(user, site).user_profile)
+        set_mock.assert_called_once_with(
+            USER_PROFILE_CACHE_KEY.format(user_id=user.pk, site_id=site.pk),
+            NO_USER_PROFILE,
+            5
+        )
@@ -38,8 +38,12 @@ class UserProfileDetailView(UserProfileRequiredMixin,
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        timeline_paginator = self.get_timeline_paginator()
-        timeline_page = self.get_timeline_page(timeline_paginator)
+        if self.is_cursor_pagination():
+            timeline_page = self.build_cursor_page(self.get_timeline_queryset(),
+                                                   self.timeline_paginate_by)
+        else:
+            timeline_paginator = self.get_timeline_paginator()
+            timeline_page = self.get_timeline_page(timeline_paginator)
         context.update({
             "posts": timeline_page.object_list,
             "posts_page": timeline_page
@@ -50,7 +54,9 @@ class UserProfileDetailView(UserProfileRequiredMixin,
         """
         get timeline queryset
         """
-        return self.build_sliced_queryset(self.get_object().posts.all())
+        queryset = self.get_object().posts.select_related("user_profile__site")\
+            .with_user_like(self.request.user)
+        return self.build_sliced_queryset(queryset)
 
     def get_timeline_paginator(self):
         """
@@ -1,8 +1,17 @@
 """
 rollsocialnetwork tests
 """
-from django.test import (
+import asyncio
+import json
+import threading
+from io import StringIO
+from unittest import mock
+from channels.layers import get_channel_layer  # type: ignore[import-untyped]
+from channels.testing import WebsocketCommunicator  # type: ignore[import-untyped]
+from django.test import (  # type: ignore[attr-defined]
+    AsyncRequestFactory,
     TestCase,
+    TransactionTestCase,
     RequestFactory,
     override_settings
 )
@@ -12,17 +21,45 @@ from django.http import (
     HttpResponseRedirect
 )
 from django.contrib.auth.models import AnonymousUser
+from django.contrib.sites.models import Site
 from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.urls import reverse
 from django.utils.http import urlencode
 from django.views import View
-from .views import NginxAccelRedirectView
+from .management.commands.watcher_benchmark import percentile
+from .sites import (
+    SITE_REGISTRY_VERSION_CACHE_KEY,
+    SiteRegistry,
+    site_registry,
+)
+from .metrics import (
+    Histogram,
+    Registry,
+)
+from .views import (
+    NginxAccelRedirectView,
+    WatcherEventsView,
+    WatcherMetricsView,
+)
 from .tests_factory import (
     SiteFactory,
     UserFactory,
 )
 from .opener_callback import OpenerCallbackRedirectURLMixin
 from .context_processors import home_site
+from .middleware import CurrentSiteMiddleware
+from .consumers import WatcherConsumer
+from .watcher import (
+    BINARY_SUBPROTOCOL,
+    CoalescingNotifier,
+    Watcher,
+    local_groups,
+    pack_messages,
+    unpack_frame,
+)
 
 class LogoutViewTest(TestCase):
     """
@@ -180,6 +217,23 @@ class HomeSiteContextProcessorTest(TestCase):
             result_is_home_site = result.get("is_home_site")
             self.assertTrue(result_is_home_site)
 
+    def test_lazy_memoized(self):
+        """
+        home site is queried once per request, on use
+        """
+        request = self.factory.get(
+            "/test/",
+            SERVER_NAME=self.site.domain
+        )
+        request.site = self.site
+        with override_settings(HOME_SITE_ID=self.site.id):
+            with self.assertNumQueries(0):
+                result = home_site(request)
+            with self.assertNumQueries(1):
+                self.assertEqual(result["home_site"].pk, self.site.pk)
+            with self.assertNumQueries(0):
+                self.assertEqual(home_site(request)["home_site"].pk, self.site.pk)
+
     def test_not_is(self):
         """
         not is home site
@@ -193,3 +247,706 @@ class HomeSiteContextProcessorTest(TestCase):
             result = home_site(request)
             result_is_home_site = result.get("is_home_site")
             self.assertFalse(result_is_home_site)
+
+class CoalescingNotifierTest(TestCase):
+    """
+    CoalescingNotifier test
+    """
+
+    def setUp(self):
+        # a long window, the tests flush manually
+        self.notifier = CoalescingNotifier(60)
+
+    def tearDown(self):
+        self.notifier.flush()
+
+    def test_keeps_latest_message_per_group(self):
+        """
+        test keeps latest message per group
+        """
+        with mock.patch.object(CoalescingNotifier, "send") as send_mock:
+            self.notifier.push("posts_1_likes_count", {"likes_count": 1})
+            self.notifier.push("posts_1_likes_count", {"likes_count": 2})
+            self.notifier.push("posts_2_likes_count", {"likes_count": 7})
+            send_mock.assert_not_called()
+            self.notifier.flush()
+        send_mock.assert_called_once_with({
+            "posts_1_likes_count": {"likes_count": 2},
+            "posts_2_likes_count": {"likes_count": 7},
+        })
+
+    def test_flush_empty(self):
+        """
+        test flush without pending messages
+        """
+        with mock.patch.object(CoalescingNotifier, "send") as send_mock:
+            self.notifier.flush()
+        send_mock.assert_not_called()
+
+    def test_send_to_channel_layer(self):
+        """
+        test send to channel layer
+        """
+        channel_layer = mock.Mock(group_send=mock.AsyncMock())
+        with mock.patch("rollsocialnetwork.watcher.get_channel_layer",
+                        return_value=channel_layer):
+            self.notifier.push("posts_1_likes_count", {"likes_count": 3})
+            self.notifier.flush()
+        channel_layer.group_send.assert_awaited_once_with(
+            "posts_1_likes_count", {"likes_count": 3}
+        )
+
+    def test_skips_stale_event_loop(self):
+        """
+        test messages are sent on the set event loop while it runs, from
+        the flushing thread once it is closed
+        """
+        stale_loop = asyncio.new_event_loop()
+        stale_loop.close()
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+        self.addCleanup(loop.close)
+        self.addCleanup(thread.join)
+        self.addCleanup(loop.call_soon_threadsafe, loop.stop)
+        sent_on = []
+
+        async def send(_pending):
+            sent_on.append(asyncio.get_running_loop())
+
+        with mock.patch.object(CoalescingNotifier, "send", side_effect=send):
+            self.notifier.set_loop(loop)
+            self.notifier.push("posts_1_likes_count", {"likes_count": 3})
+            self.notifier.flush()
+            self.notifier.set_loop(stale_loop)
+            self.notifier.push("posts_1_likes_count", {"likes_count": 4})
+            self.notifier.flush()
+        self.assertEqual(len(sent_on), 2)
+        self.assertIs(sent_on[0], loop)
+        self.assertIsNot(sent_on[1], stale_loop)
+
+class WatcherNotifyTest(TestCase):
+    """
+    Watcher.notify test
+    """
+
+    def test_coalesced(self):
+        """
+        test notify pushes to the coalescing notifier
+        """
+        cache.clear()
+        notifier = mock.Mock()
+        with mock.patch.object(Watcher, "get_notifier", return_value=notifier), \
+             override_settings(WATCHER_NOTIFY_WINDOW=0.25):
+            Watcher.notify("posts", "likes_count", 5, pk=1)
+        notifier.push.assert_called_once_with("posts_1_likes_count", {
+            "type": "posts.likes_count",
+            "pk": 1,
+            "group_name": "posts_1_likes_count",
+            "seq": 1,
+            "likes_count": 5,
+        })
+
+    @mock.patch.object(Watcher, "get_notifier")
+    def test_seq_stored_value(self, _get_notifier_mock):
+        """
+        test notify numbers and stores the values of the group
+        """
+        cache.clear()
+        Watcher.notify("posts", "likes_count", 5, pk=1)
+        Watcher.notify("posts", "likes_count", 6, pk=1)
+        Watcher.notify("posts", "likes_count", 1, pk=2)
+        snapshot = Watcher.get_snapshot([("posts", "likes_count", 1),
+                                         ("posts", "likes_count", 2)])
+        self.assertEqual([(message["seq"], message["likes_count"]) for message in snapshot],
+                         [(2, 6), (1, 1)])
+
+    def test_watch_registry(self):
+        """
+        test watch declares the attribute for refs, codes and snapshots
+        """
+        with mock.patch.dict(Watcher.registry):
+            watched = Watcher.watch("profiles", "posts_count",
+                                    code=99,
+                                    loader=lambda pks: {pk: 3 for pk in pks})
+            self.assertEqual(Watcher.registry["profiles.posts_count"], watched)
+            self.assertEqual(Watcher.get_codes()["profiles.posts_count"], 99)
+            self.assertEqual(Watcher.destructe_ref({"model": "profiles",
+                                                    "attr": "posts_count",
+                                                    "pk": 1}),
+                             ("profiles", "posts_count", 1))
+            snapshot = Watcher.get_snapshot([("profiles", "posts_count", 5)])
+            self.assertEqual(snapshot[0]["posts_count"], 3)
+            with self.assertRaises(ValueError):
+                Watcher.watch("profiles", "followers_count", code=99, loader=dict)
+        with self.assertRaises(ValueError):
+            Watcher.destructe_ref({"model": "profiles", "attr": "posts_count"})
+
+    def test_synchronous(self):
+        """
+        test notify without window sends synchronously
+        """
+        channel_layer = mock.Mock(group_send=mock.AsyncMock())
+        with mock.patch("rollsocialnetwork.watcher.get_channel_layer",
+                        return_value=channel_layer), \
+             override_settings(WATCHER_NOTIFY_WINDOW=0):
+            Watcher.notify("posts", "likes_count", 5, pk=1)
+        channel_layer.group_send.assert_awaited_once()
+
+class WatcherConsumerTest(TestCase):
+    """
+    WatcherConsumer test
+    """
+
+    def setUp(self):
+        cache.clear()
+
+    async def test_ref_subscription(self):
+        """
+        test ref subscription receives group messages
+        """
+        communicator = WebsocketCommunicator(WatcherConsumer.as_asgi(), "/ws/watcher/")
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        await communicator.send_json_to({
+            "ref": {"model": "posts", "attr": "likes_count", "pk": 1}
+        })
+        self.assertTrue(await communicator.receive_nothing())
+        message = {
+            "type": "posts.likes_count",
+            "pk": 1,
+            "group_name": "posts_1_likes_count",
+            "likes_count": 3,
+        }
+        await get_channel_layer().group_send("posts_1_likes_count", message)
+        self.assertEqual(await communicator.receive_json_from(), message)
+        await communicator.disconnect()
+
+    async def test_not_subscribed(self):
+        """
+        test other groups messages are not received
+        """
+        communicator = WebsocketCommunicator(WatcherConsumer.as_asgi(), "/ws/watcher/")
+        await communicator.connect()
+        await communicator.send_json_to({
+            "ref": {"model": "posts", "attr": "likes_count", "pk": 1}
+        })
+        await communicator.receive_nothing()
+        await get_channel_layer().group_send("posts_2_likes_count", {
+            "type": "posts.likes_count",
+            "pk": 2,
+            "group_name": "posts_2_likes_count",
+            "likes_count": 3,
+        })
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.disconnect()
+
+    def build_message(self, pk, likes_count=1, seq=0):
+        """
+        build posts.likes_count message
+        """
+        return {
+            "type": "posts.likes_count",
+            "pk": pk,
+            "group_name": f"posts_{pk}_likes_count",
+            "seq": seq,
+            "likes_count": likes_count,
+        }
+
+    def build_ref(self, pk):
+        """
+        build posts.likes_count ref
+        """
+        return {"model": "posts", "attr": "likes_count", "pk": pk}
+
+    async def test_subscribe_unsubscribe(self):
+        """
+        test subscribe and unsubscribe ref lists
+        """
+        communicator = WebsocketCommunicator(WatcherConsumer.as_asgi(), "/ws/watcher/")
+        await communicator.connect()
+        await communicator.send_json_to({
+            "subscribe": [self.build_ref(11), self.build_ref(12)]
+        })
+        await communicator.receive_nothing()
+        channel_layer = get_channel_layer()
+        await channel_layer.group_send("posts_12_likes_count", self.build_message(12))
+        self.assertEqual(await communicator.receive_json_from(), self.build_message(12))
+        await communicator.send_json_to({"unsubscribe": [self.build_ref(12)]})
+        await communicator.receive_nothing()
+        await channel_layer.group_send("posts_12_likes_count", self.build_message(12))
+        self.assertTrue(await communicator.receive_nothing())
+        await channel_layer.group_send("posts_11_likes_count", self.build_message(11))
+        self.assertEqual(await communicator.receive_json_from(), self.build_message(11))
+        await communicator.disconnect()
+
+    async def test_subscriptions_limit(self):
+        """
+        test subscriptions limit
+        """
+        communicator = WebsocketCommunicator(WatcherConsumer.as_asgi(), "/ws/watcher/")
+        await communicator.connect()
+        with override_settings(WATCHER_MAX_SUBSCRIPTIONS=2):
+            await communicator.send_json_to({
+                "subscribe": [self.build_ref(21), self.build_ref(22), self.build_ref(23)]
+            })
+            response = await communicator.receive_json_from()
+        self.assertEqual(response, {
+            "type": "error",
+            "error": "subscriptions limit exceeded",
+            "refs": [self.build_ref(23)]
+        })
+        await get_channel_layer().group_send("posts_23_likes_count", self.build_message(23))
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.disconnect()
+
+    async def test_invalid_refs(self):
+        """
+        test invalid refs
+        """
+        communicator = WebsocketCommunicator(WatcherConsumer.as_asgi(), "/ws/watcher/")
+        await communicator.connect()
+        await communicator.send_json_to({"subscribe": [{"model": "posts"}]})
+        response = await communicator.receive_json_from()
+        self.assertEqual(response["type"], "error")
+        self.assertEqual(response["error"], "ref.attr field is required")
+        await communicator.send_json_to({
+            "subscribe": [{"model": "unknown", "attr": "attr", "pk": 1}]
+        })
+        response = await communicator.receive_json_from()
+        self.assertEqual(response["error"], "unknown.attr is not watched")
+        await communicator.disconnect()
+
+    async def test_disconnect_discards_groups(self):
+        """
+        test disconnect discards groups
+        """
+        communicator = WebsocketCommunicator(WatcherConsumer.as_asgi(), "/ws/watcher/")
+        await communicator.connect()
+        await communicator.send_json_to({"subscribe": [self.build_ref(31)]})
+        await communicator.receive_nothing()
+        channel_layer = get_channel_layer()
+        self.assertEqual(len(channel_layer.groups["posts_31_likes_count"]), 1)
+        await communicator.disconnect()
+        self.assertNotIn("posts_31_likes_count", channel_layer.groups)
+
+    async def test_connect_attaches_event_loop(self):
+        """
+        test connect sets its running loop as the notifier event loop
+        """
+        communicator = WebsocketCommunicator(WatcherConsumer.as_asgi(), "/ws/watcher/")
+        with mock.patch.object(CoalescingNotifier, "set_loop") as set_loop_mock:
+            await communicator.connect()
+        set_loop_mock.assert_called_once_with(asyncio.get_running_loop())
+        await communicator.disconnect()
+
+    async def test_subscribe_snapshot(self):
+        """
+        test subscribe is answered with the stored values
+        """
+        Watcher.store_value("posts_41_likes_count", 7, seq=3)
+        communicator = WebsocketCommunicator(WatcherConsumer.as_asgi(), "/ws/watcher/")
+        await communicator.connect()
+        await communicator.send_json_to({"subscribe": [self.build_ref(41)]})
+        self.assertEqual(await communicator.receive_json_from(), self.build_message(41, 7, seq=3))
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.disconnect()
+
+    async def test_binary_subprotocol(self):
+        """
+        test binary subprotocol batches updates in one frame
+        """
+        communicator = WebsocketCommunicator(WatcherConsumer.as_asgi(),
+                                             "/ws/watcher/",
+                                             subprotocols=[BINARY_SUBPROTOCOL])
+        connected, subprotocol = await communicator.connect()
+        self.assertTrue(connected)
+        self.assertEqual(subprotocol, BINARY_SUBPROTOCOL)
+        self.assertEqual(await communicator.receive_json_from(), {
+            "type": "codes",
+            "codes": Watcher.get_codes()
+        })
+        await communicator.send_json_to({
+            "subscribe": [self.build_ref(51), self.build_ref(52)]
+        })
+        await communicator.receive_nothing()
+        channel_layer = get_channel_layer()
+        await channel_layer.group_send("posts_51_likes_count", self.build_message(51, 4, seq=2))
+        await channel_layer.group_send("posts_52_likes_count", self.build_message(52, 9))
+        frame = await communicator.receive_from()
+        self.assertEqual(unpack_frame(frame), [
+            (Watcher.registry["posts.likes_count"].code, 51, 2, 4),
+            (Watcher.registry["posts.likes_count"].code, 52, 0, 9),
+        ])
+        await communicator.disconnect()
+
+    async def test_resume(self):
+        """
+        test resume sends only values changed after the client seq
+        """
+        Watcher.store_value("posts_61_likes_count", 5, seq=4)
+        Watcher.store_value("posts_62_likes_count", 8, seq=7)
+        communicator = WebsocketCommunicator(WatcherConsumer.as_asgi(), "/ws/watcher/")
+        await communicator.connect()
+        await communicator.send_json_to({
+            "subscribe": [dict(self.build_ref(61), seq=4), dict(self.build_ref(62), seq=6)]
+        })
+        self.assertEqual(await communicator.receive_json_from(), self.build_message(62, 8, seq=7))
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.disconnect()
+
+    async def test_local_groups_tracking(self):
+        """
+        test local group sizes follow subscriptions
+        """
+        communicator = WebsocketCommunicator(WatcherConsumer.as_asgi(), "/ws/watcher/")
+        await communicator.connect()
+        await communicator.send_json_to({"subscribe": [self.build_ref(91)]})
+        await communicator.receive_nothing()
+        self.assertEqual(local_groups["posts_91_likes_count"], 1)
+        await communicator.disconnect()
+        self.assertNotIn("posts_91_likes_count", local_groups)
+
+class BinaryFramingTest(TestCase):
+    """
+    watcher binary framing test
+    """
+
+    def test_pack_unpack(self):
+        """
+        test pack and unpack
+        """
+        frames, unpacked = pack_messages([
+            Watcher.build_message("posts", "likes_count", 3, pk=1),
+            Watcher.build_message("sites", "latest_post_pk", None, pk=2),
+        ])
+        self.assertEqual(unpacked, [])
+        self.assertEqual(len(frames), 1)
+        self.assertEqual(unpack_frame(frames[0]), [
+            (Watcher.registry["posts.likes_count"].code, 1, 0, 3),
+            (Watcher.registry["sites.latest_post_pk"].code, 2, 0, None),
+        ])
+
+    def test_unpackable_messages(self):
+        """
+        test messages not fitting the layout are returned
+        """
+        messages = [
+            Watcher.build_message("posts", "likes_count", 3, pk="abc"),
+            Watcher.build_message("unknown", "attr", 3, pk=1),
+        ]
+        frames, unpacked = pack_messages(messages)
+        self.assertEqual(frames, [])
+        self.assertEqual(unpacked, messages)
+
+class WatcherEventsViewTest(TestCase):
+    """
+    WatcherEventsView test
+    """
+
+    def setUp(self):
+        self.factory = AsyncRequestFactory()
+        cache.clear()
+
+    def build_refs(self, *pks):
+        """
+        build posts.likes_count refs query
+        """
+        return json.dumps([{"model": "posts", "attr": "likes_count", "pk": pk} for pk in pks])
+
+    async def test_invalid_refs(self):
+        """
+        test invalid refs
+        """
+        for refs in ["", "{}", json.dumps([{"model": "posts"}]), "[]"]:
+            request = self.factory.get("/watcher/events/", {"refs": refs})
+            response = await WatcherEventsView.as_view()(request)
+            self.assertEqual(response.status_code, 400)
+
+    async def test_stream(self):
+        """
+        test stream snapshot, updates and resume ids
+        """
+        Watcher.store_value("posts_71_likes_count", 2, seq=5)
+        Watcher.store_value("posts_72_likes_count", 4, seq=8)
+        request = self.factory.get("/watcher/events/",
+                                   {"refs": self.build_refs(71, 72)},
+                                   headers={"Last-Event-ID": "5.7"})
+        response = await WatcherEventsView.as_view()(request)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        content = response.streaming_content
+        self.assertEqual(await anext(content), b"retry: 3000\n\n")
+        event = await anext(content)
+        self.assertTrue(event.startswith(b"id: 5.8\ndata: "))
+        self.assertEqual(json.loads(event.split(b"data: ")[1])["likes_count"], 4)
+        await get_channel_layer().group_send(
+            "posts_71_likes_count",
+            Watcher.build_message("posts", "likes_count", 3, pk=71, seq=6)
+        )
+        event = await anext(content)
+        self.assertTrue(event.startswith(b"id: 6.8\ndata: "))
+        await content.aclose()
+
+    async def test_heartbeat(self):
+        """
+        test heartbeat comment on idle streams
+        """
+        request = self.factory.get("/watcher/events/", {"refs": self.build_refs(81)})
+        response = await WatcherEventsView.as_view()(request)
+        content = response.streaming_content
+        await anext(content)
+        with override_settings(WATCHER_SSE_HEARTBEAT=0.01):
+            self.assertEqual(await anext(content), b": heartbeat\n\n")
+        await content.aclose()
+
+class MetricsRegistryTest(TestCase):
+    """
+    metrics Registry test
+    """
+
+    def test_render(self):
+        """
+        test render counters, gauges, histograms and collectors
+        """
+        registry = Registry()
+        counter = registry.counter("test_total", "Test counter.")
+        self.assertIs(registry.counter("test_total", "Test counter."), counter)
+        counter.inc()
+        registry.gauge("test_active", "Test gauge.").set(3)
+        histogram = registry.histogram("test_seconds", "Test histogram.", buckets=(0.1, 1))
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(5)
+        registry.collector(lambda: ["test_collected 1"])
+        lines = registry.render().splitlines()
+        self.assertIn("test_total 1.0", lines)
+        self.assertIn("# TYPE test_active gauge", lines)
+        self.assertIn("test_active 3", lines)
+        self.assertIn('test_seconds_bucket{le="0.1"} 1', lines)
+        self.assertIn('test_seconds_bucket{le="1"} 2', lines)
+        self.assertIn('test_seconds_bucket{le="+Inf"} 3', lines)
+        self.assertIn("test_seconds_sum 5.55", lines)
+        self.assertIn("test_seconds_count 3", lines)
+        self.assertIn("test_collected 1", lines)
+
+    def test_histogram_bucket_bounds(self):
+        """
+        test histogram buckets are inclusive upper bounds
+        """
+        histogram = Histogram("test_bounds", "Test bounds.", buckets=(1, 2))
+        histogram.observe(1)
+        histogram.observe(2)
+        self.assertEqual(histogram.counts, [1, 1, 0])
+
+class WatcherMetricsViewTest(TestCase):
+    """
+    WatcherMetricsView test
+    """
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.user = UserFactory().create_user()
+
+    def get(self, user, **headers):
+        """
+        get metrics
+        """
+        request = self.factory.get("/watcher/metrics/", headers=headers)
+        request.user = user
+        return WatcherMetricsView.as_view()(request)
+
+    def test_forbidden(self):
+        """
+        test forbidden without staff user or token
+        """
+        self.assertEqual(self.get(AnonymousUser()).status_code, 403)
+        self.assertEqual(self.get(self.user).status_code, 403)
+        self.assertEqual(self.get(AnonymousUser(), authorization="Bearer ").status_code, 403)
+        with override_settings(WATCHER_METRICS_TOKEN="secret"):
+            response = self.get(AnonymousUser(), authorization="Bearer other")
+        self.assertEqual(response.status_code, 403)
+
+    def test_token(self):
+        """
+        test token
+        """
+        with override_settings(WATCHER_METRICS_TOKEN="secret"):
+            response = self.get(AnonymousUser(), authorization="Bearer secret")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"# TYPE watcher_notify_seconds histogram", response.content)
+
+    def test_staff(self):
+        """
+        test staff user
+        """
+        self.user.is_staff = True
+        response = self.get(self.user)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"watcher_connections_active", response.content)
+        self.assertIn(b"watcher_group_size_bucket", response.content)
+
+class WatcherBenchmarkTest(TestCase):
+    """
+    watcher_benchmark command test
+    """
+
+    def test_percentile(self):
+        """
+        test nearest-rank percentile
+        """
+        values = [float(value) for value in range(1, 101)]
+        self.assertEqual(percentile(values, 50), 50.0)
+        self.assertEqual(percentile(values, 99), 99.0)
+        self.assertEqual(percentile(values, 100), 100.0)
+        self.assertEqual(percentile([3.0], 50), 3.0)
+        self.assertEqual(percentile([], 50), 0.0)
+
+class WatcherBenchmarkCommandTest(TransactionTestCase):
+    """
+    watcher_benchmark command test, fixtures and likes are written from
+    the sync_to_async threads so they must be committed
+    """
+
+    def setUp(self):
+        cache.clear()
+
+    def test_memory_layer(self):
+        """
+        test a small benchmark on the in-memory channel layer delivers every like burst
+        """
+        stdout = StringIO()
+        call_command("watcher_benchmark",
+                     subscribers=4,
+                     posts=2,
+                     bursts=2,
+                     burst_size=2,
+                     layers=["memory"],
+                     timeout=2,
+                     stdout=stdout)
+        self.assertIn("memory: 4 likes", stdout.getvalue())
+        self.assertIn("4 deliveries, 0 missed", stdout.getvalue())
+        self.assertFalse(Site.objects.filter(domain__startswith="watcher-benchmark-").exists())
+
+class WatcherConnectionsTest(TestCase):
+    """
+    watcher_connections command test
+    """
+
+    def setUp(self):
+        cache.clear()
+
+    def test_broadcast_after_snapshot(self):
+        """
+        test the subscribe snapshot is not taken for the broadcast
+        """
+        Watcher.store_value("posts_81_likes_count", 7, seq=3)
+        stdout = StringIO()
+        call_command("watcher_connections",
+                     connections=3,
+                     batch_size=2,
+                     post=81,
+                     timeout=2,
+                     stdout=stdout)
+        self.assertIn("broadcast delivered to 3/3", stdout.getvalue())
+
+    def test_snapshot_not_counted(self):
+        """
+        test connections only receiving the snapshot miss the broadcast
+        """
+        Watcher.store_value("posts_82_likes_count", 7, seq=3)
+        path = "rollsocialnetwork.management.commands.watcher_connections.get_channel_layer"
+        with mock.patch(path) as get_channel_layer_mock:
+            get_channel_layer_mock.return_value.group_send = mock.AsyncMock()
+            with self.assertRaisesMessage(CommandError, "2 connections missed the broadcast"):
+                call_command("watcher_connections",
+                             connections=2,
+                             post=82,
+                             timeout=0.5,
+                             stdout=StringIO())
+
+class SiteRegistryTest(TestCase):
+    """
+    SiteRegistry test
+    """
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.site = SiteFactory().create_site()
+        cache.clear()
+
+    def test_loaded_once(self):
+        """
+        test sites are loaded in one query
+        """
+        registry = SiteRegistry()
+        with self.assertNumQueries(1):
+            self.assertEqual(registry.get(self.site.pk), self.site)
+            self.assertEqual(registry.get_by_domain(self.site.domain.upper()), self.site)
+            self.assertIn(self.site.pk, registry)
+            self.assertIn(self.site, registry.all())
+        with self.assertRaises(Site.DoesNotExist):
+            registry.get(0)
+
+    def test_get_by_request(self):
+        """
+        test get by request host, with or without port
+        """
+        request = self.factory.get("/", SERVER_NAME=self.site.domain, SERVER_PORT=8000)
+        self.assertEqual(site_registry.get_by_request(request), self.site)
+        request = self.factory.get("/", SERVER_NAME="unknown.invalid")
+        with self.assertRaises(Site.DoesNotExist):
+            site_registry.get_by_request(request)
+
+    def test_get_current(self):
+        """
+        test get current returns the SITE_ID site when set, whatever the host
+        """
+        request = self.factory.get("/", SERVER_NAME="localhost")
+        with override_settings(SITE_ID=self.site.pk):
+            self.assertEqual(site_registry.get_current(request), self.site)
+            request.site = None
+            CurrentSiteMiddleware(lambda request: None).process_request(request)
+            self.assertEqual(request.site, self.site)
+        request = self.factory.get("/", SERVER_NAME=self.site.domain)
+        with override_settings(SITE_ID=None):
+            self.assertEqual(site_registry.get_current(request), self.site)
+
+    def test_invalidated_on_save(self):
+        """
+        test site save invalidates the registry
+        """
+        self.assertEqual(site_registry.get(self.site.pk).name, self.site.name)
+        self.site.name = "renamed"
+        self.site.save()
+        self.assertEqual(site_registry.get(self.site.pk).name, "renamed")
+
+    def test_version_change(self):
+        """
+        test another worker invalidation reloads the registry after the check interval
+        """
+        registry = SiteRegistry()
+        registry.load()
+        Site.objects.filter(pk=self.site.pk).update(name="renamed")
+        cache.set(SITE_REGISTRY_VERSION_CACHE_KEY, 0, None)
+        with self.assertNumQueries(0):
+            self.assertEqual(registry.get(self.site.pk).name, self.site.name)
+        with override_settings(SITE_REGISTRY_CHECK_INTERVAL=0):
+            self.assertEqual(registry.get(self.site.pk).name, "renamed")
+
+    def test_reload_on_miss(self):
+        """
+        test a lookup miss reloads the registry once, for a site created or
+        edited by another worker whose invalidation was not seen yet
+        """
+        registry = SiteRegistry()
+        registry.load()
+        Site.objects.filter(pk=self.site.pk).update(domain="edited.invalid")
+        (site,) = Site.objects.bulk_create([Site(domain="created.invalid", name="created")])
+        site = Site.objects.get(domain=site.domain)
+        with self.assertNumQueries(1):
+            self.assertEqual(registry.get(site.pk), site)
+        with self.assertNumQueries(0):
+            self.assertEqual(registry.get_by_domain("edited.invalid"), self.site)
+        request = self.factory.get("/", SERVER_NAME="unknown.invalid", SERVER_PORT=8000)
+        with self.assertNumQueries(1), self.assertRaises(Site.DoesNotExist):
+            registry.get_by_request(request)
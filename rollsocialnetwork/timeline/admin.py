@@ -5,7 +5,9 @@ from django.contrib import admin
 from .models import (
     Post,
     Like,
+    RollStats,
 )
 
 admin.site.register(Post)
 admin.site.register(Like)
+admin.site.register(RollStats)
@@ -0,0 +1,57 @@
+"""
+rebuild feeds command
+"""
+from django.conf import settings
+from django.contrib.sites.models import Site
+from django.core.management.base import (
+    BaseCommand,
+    CommandError,
+)
+from django.db import transaction
+from rollsocialnetwork.timeline.models import (
+    FeedEntry,
+    Post,
+)
+
+class Command(BaseCommand):
+    """
+    rebuild materialized feeds from the post table
+    """
+    help = "Backfill the materialized timeline feeds from the Post table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--site",
+                            type=int,
+                            action="append",
+                            dest="site_ids",
+                            help="site id to rebuild, all sites when omitted")
+        parser.add_argument("--batch-size",
+                            type=int,
+                            default=500,
+                            help="number of entries inserted per query")
+
+    def rebuild(self, site_id: int, batch_size: int) -> int:
+        """
+        rebuild a site feed
+        """
+        posts = Post.objects.order_by("-created_at", "-pk")
+        if site_id != settings.HOME_SITE_ID:
+            posts = posts.filter(user_profile__site_id=site_id)
+        rows = posts.values_list("pk", "created_at")[:settings.TIMELINE_FEED_MAX_LENGTH]
+        entries = [FeedEntry(site_id=site_id,
+                             post_id=pk,
+                             created_at=created_at)
+                   for pk, created_at in rows]
+        with transaction.atomic():
+            FeedEntry.objects.filter(site_id=site_id).delete()
+            FeedEntry.objects.bulk_create(entries, batch_size=batch_size)
+        return len(entries)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        if batch_size < 1:
+            raise CommandError("--batch-size must be greater than zero")
+        site_ids = options["site_ids"] or Site.objects.values_list("pk", flat=True)
+        for site_id in site_ids:
+            count = self.rebuild(site_id, batch_size)
+            self.stdout.write(f"site {site_id}: {count} feed entries")
@@ -0,0 +1,129 @@
+"""
+rebuild hot scores command
+"""
+from datetime import timedelta
+from itertools import islice
+import numpy as np
+from django.conf import settings
+from django.core.management.base import (
+    BaseCommand,
+    CommandError,
+)
+from django.db import models
+from django.utils import timezone
+from rollsocialnetwork.timeline.models import (
+    HOT_SCORE_EPOCH,
+    HOT_SCORE_MIN,
+    Like,
+    Post,
+    RollStats,
+)
+
+class Command(BaseCommand):
+    """
+    recompute all rolls hot scores with vectorized scoring
+    """
+    help = ("Recompute RollStats.hot_score from the posts and likes of the last "
+            "--half-lives half-lives. Run it periodically to drop deleted posts and "
+            "likes from the incrementally updated scores.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--half-lives",
+                            type=float,
+                            default=40,
+                            help="number of half-lives of events scored, older ones weigh "
+                                 "less than 1e-12 of a fresh one")
+        parser.add_argument("--batch-size",
+                            type=int,
+                            default=1000,
+                            help="number of rolls updated per query")
+        parser.add_argument("--chunk-size",
+                            type=int,
+                            default=10000,
+                            help="number of events fetched and scored at once")
+
+    def get_chunk_scores(self, roll_site_ids, chunk, weight, reference):
+        """
+        get roll indexes and exp(score - reference) of the (site id, time)
+        events of a chunk, events of unknown rolls are dropped
+        """
+        site_ids = np.fromiter((site_id for site_id, _ in chunk),
+                               dtype=np.int64,
+                               count=len(chunk))
+        hours = np.fromiter(((at - HOT_SCORE_EPOCH).total_seconds() / 3600
+                             for _, at in chunk),
+                            dtype=np.float64,
+                            count=len(chunk))
+        indexes = np.searchsorted(roll_site_ids, site_ids)
+        known = indexes < len(roll_site_ids)
+        known[known] = roll_site_ids[indexes[known]] == site_ids[known]
+        scores = np.log(weight) + hours[known] / settings.HOT_SCORE_HALF_LIFE * np.log(2)
+        return indexes[known], np.exp(scores - reference)
+
+    def get_hot_scores(self, roll_site_ids, since, chunk_size):
+        """
+        get hot scores of the sorted roll site ids, log-sum-exp of the
+        events scores per roll, HOT_SCORE_MIN for rolls without events.
+
+        events are streamed in chunks and summed relative to the score of a
+        unit event now, events since the last half-lives stay in float range
+        """
+        reference = RollStats.get_hot_score_event(1, timezone.now())
+        sums = np.zeros(len(roll_site_ids))
+        events = [(Post.objects.filter(created_at__gte=since)
+                   .values_list("user_profile__site_id", "created_at"),
+                   settings.HOT_SCORE_POST_WEIGHT)]
+        if settings.HOT_SCORE_LIKE_WEIGHT > 0:
+            events.append((Like.objects.filter(liked_at__gte=since)
+                           .values_list("post__user_profile__site_id", "liked_at"),
+                           settings.HOT_SCORE_LIKE_WEIGHT))
+        for qs, weight in events:
+            rows = qs.iterator(chunk_size=chunk_size)
+            while chunk := list(islice(rows, chunk_size)):
+                np.add.at(sums, *self.get_chunk_scores(roll_site_ids, chunk, weight, reference))
+        with np.errstate(divide="ignore"):
+            return np.where(sums > 0, reference + np.log(sums), HOT_SCORE_MIN)
+
+    def write_hot_scores(self, rolls, batch_size) -> int:
+        """
+        write the (site id, read hot score, rebuilt hot score) rolls, one
+        query per batch. Rolls whose hot score changed since it was read are
+        skipped, the increments landed meanwhile would be lost, they are
+        rebuilt on next run. Returns the number of rolls written
+        """
+        written = 0
+        for start in range(0, len(rolls), batch_size):
+            batch = rolls[start:start + batch_size]
+            unchanged = models.Q()
+            for site_id, read_hot_score, _ in batch:
+                unchanged |= models.Q(site_id=site_id, hot_score=read_hot_score)
+            written += RollStats.objects.filter(unchanged).update(hot_score=models.Case(
+                *[models.When(site_id=site_id, then=models.Value(hot_score))
+                  for site_id, _, hot_score in batch],
+                output_field=models.FloatField()
+            ))
+        return written
+
+    def handle(self, *args, **options):
+        if options["half_lives"] <= 0:
+            raise CommandError("--half-lives must be greater than zero")
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be greater than zero")
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be greater than zero")
+        since = timezone.now() - timedelta(hours=settings.HOT_SCORE_HALF_LIFE
+                                           * options["half_lives"])
+        # read before the events, a roll incremented meanwhile is detected on write
+        read_rolls = list(RollStats.objects.order_by("site_id")
+                          .values_list("site_id", "hot_score"))
+        roll_site_ids = np.fromiter((site_id for site_id, _ in read_rolls),
+                                    dtype=np.int64,
+                                    count=len(read_rolls))
+        hot_scores = self.get_hot_scores(roll_site_ids, since, options["chunk_size"])
+        written = self.write_hot_scores([(site_id, read_hot_score, float(hot_score))
+                                         for (site_id, read_hot_score), hot_score
+                                         in zip(read_rolls, hot_scores)],
+                                        options["batch_size"])
+        scored = int(np.count_nonzero(hot_scores > HOT_SCORE_MIN))
+        self.stdout.write(f"{written} rolls hot scores rebuilt, {scored} with activity, "
+                          f"{len(read_rolls) - written} skipped as updated meanwhile")
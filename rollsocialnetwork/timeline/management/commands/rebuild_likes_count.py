@@ -0,0 +1,77 @@
+"""
+rebuild likes count command
+"""
+from django.core.management.base import (
+    BaseCommand,
+    CommandError,
+)
+from django.db.models import (
+    Count,
+    OuterRef,
+    Subquery,
+)
+from django.db.models.functions import Coalesce
+from rollsocialnetwork.timeline.models import (
+    Like,
+    Post,
+)
+from rollsocialnetwork.watcher import Watcher
+
+class Command(BaseCommand):
+    """
+    rebuild posts likes count in chunks, reporting the drift found
+    """
+    help = "Rebuild the stored Post.likes_count counters from the Like table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size",
+                            type=int,
+                            default=1000,
+                            help="number of posts checked per query")
+        parser.add_argument("--check",
+                            action="store_true",
+                            help="only report the drift, exit with error when found")
+
+    def get_actual_likes_count(self):
+        """
+        get actual likes count subquery
+        """
+        likes = Like.objects.filter(post=OuterRef("pk"))\
+            .order_by()\
+            .values("post")\
+            .annotate(count=Count("pk"))\
+            .values("count")
+        return Coalesce(Subquery(likes), 0)
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        check = options["check"]
+        if chunk_size < 1:
+            raise CommandError("--chunk-size must be greater than zero")
+        last_pk = 0
+        checked = 0
+        drifted = 0
+        while True:
+            chunk = list(Post.objects.filter(pk__gt=last_pk)
+                         .order_by("pk")
+                         .annotate(actual_likes_count=self.get_actual_likes_count())
+                         .values_list("pk", "likes_count", "actual_likes_count")[:chunk_size])
+            if not chunk:
+                break
+            last_pk = chunk[-1][0]
+            checked += len(chunk)
+            drifted_pks = [pk for pk, likes_count, actual in chunk if likes_count != actual]
+            if not drifted_pks:
+                continue
+            drifted += len(drifted_pks)
+            for pk, likes_count, actual in chunk:
+                if likes_count != actual:
+                    self.stdout.write(f"post {pk}: stored {likes_count}, actual {actual}")
+            if not check:
+                # recount inside the UPDATE so concurrent likes are not lost
+                Post.objects.filter(pk__in=drifted_pks)\
+                    .update(likes_count=self.get_actual_likes_count())
+                Watcher.forget_values("posts", "likes_count", drifted_pks)
+        self.stdout.write(f"{checked} posts checked, {drifted} with drift")
+        if check and drifted:
+            raise CommandError(f"{drifted} posts with likes count drift")
@@ -0,0 +1,25 @@
+"""
+rebuild roll stats command
+"""
+from django.core.management.base import BaseCommand
+from rollsocialnetwork.timeline.models import RollStats
+
+class Command(BaseCommand):
+    """
+    rebuild roll stats, or only age out the hot posts window
+    """
+    help = ("Rebuild the RollStats counters from the UserProfile and Post tables. "
+            "Run it periodically with --hot-only to age out the HOT_POSTS_SLICE window.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hot-only",
+                            action="store_true",
+                            help="only recount the hot posts of the rolls with hot posts")
+
+    def handle(self, *args, **options):
+        if options["hot_only"]:
+            updated = RollStats.age_hot_posts()
+            self.stdout.write(f"{updated} rolls hot posts aged")
+            return
+        updated = RollStats.rebuild()
+        self.stdout.write(f"{updated} rolls stats rebuilt")
@@ -0,0 +1,32 @@
+# Generated by Django 5.0.6 on 2026-10-18 12:25
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_likes_count(apps, schema_editor):
+    Post = apps.get_model('timeline', 'Post')
+    Like = apps.get_model('timeline', 'Like')
+    likes = Like.objects.filter(post=OuterRef('pk'))\
+        .order_by()\
+        .values('post')\
+        .annotate(count=Count('pk'))\
+        .values('count')
+    Post.objects.update(likes_count=Coalesce(Subquery(likes), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timeline', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_likes_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-18 12:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('social', '0001_initial'),
+        ('timeline', '0002_post_likes_count'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-created_at', '-id'], name='timeline_post_cursor_idx'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.0.6 on 2026-10-18 12:53
+
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+def fill_roll_stats(apps, schema_editor):
+    Site = apps.get_model('sites', 'Site')
+    UserProfile = apps.get_model('social', 'UserProfile')
+    Post = apps.get_model('timeline', 'Post')
+    RollStats = apps.get_model('timeline', 'RollStats')
+    hot_posts_since = timezone.now() - timedelta(hours=settings.HOT_POSTS_SLICE)
+
+    def count(qs, group):
+        return Coalesce(Subquery(qs.order_by()
+                                 .values(group)
+                                 .annotate(count=Count('pk'))
+                                 .values('count')), 0)
+
+    profiles = UserProfile.objects.filter(site_id=OuterRef('site_id'))
+    posts = Post.objects.filter(user_profile__site_id=OuterRef('site_id'))
+    RollStats.objects.bulk_create([RollStats(site_id=site_id)
+                                   for site_id in Site.objects.values_list('pk', flat=True)])
+    RollStats.objects.update(
+        profiles_count=count(profiles, 'site_id'),
+        posts_count=count(posts, 'user_profile__site_id'),
+        hot_posts_count=count(posts.filter(created_at__gte=hot_posts_since),
+                              'user_profile__site_id'),
+        last_activity_at=Subquery(posts.order_by('-created_at').values('created_at')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sites', '0002_alter_domain_unique'),
+        ('social', '0001_initial'),
+        ('timeline', '0004_feedentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollStats',
+            fields=[
+                ('site', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='sites.site')),
+                ('profiles_count', models.PositiveIntegerField(default=0, editable=False)),
+                ('posts_count', models.PositiveIntegerField(default=0, editable=False)),
+                ('hot_posts_count', models.PositiveIntegerField(default=0, editable=False)),
+                ('last_activity_at', models.DateTimeField(blank=True, editable=False, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-hot_posts_count', '-posts_count', '-profiles_count'], name='timeline_rollstats_rank_idx')],
+            },
+        ),
+        migrations.RunPython(fill_roll_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.0.6 on 2026-10-18 12:56
+
+import math
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+HOT_SCORE_EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+# events older than 40 half-lives weigh less than 1e-12 of a fresh one
+HOT_SCORE_HALF_LIVES = 40
+
+
+def fill_hot_scores(apps, schema_editor):
+    Post = apps.get_model('timeline', 'Post')
+    Like = apps.get_model('timeline', 'Like')
+    RollStats = apps.get_model('timeline', 'RollStats')
+    now = timezone.now()
+    since = now - timedelta(hours=settings.HOT_SCORE_HALF_LIFE * HOT_SCORE_HALF_LIVES)
+
+    def half_lives(at):
+        return (at - HOT_SCORE_EPOCH).total_seconds() / 3600 / settings.HOT_SCORE_HALF_LIFE
+
+    # events weights are summed relative to a unit event now, in float range
+    reference = half_lives(now)
+    events = [(Post.objects.filter(created_at__gte=since)
+               .values_list('user_profile__site_id', 'created_at'),
+               settings.HOT_SCORE_POST_WEIGHT)]
+    if settings.HOT_SCORE_LIKE_WEIGHT > 0:
+        events.append((Like.objects.filter(liked_at__gte=since)
+                       .values_list('post__user_profile__site_id', 'liked_at'),
+                       settings.HOT_SCORE_LIKE_WEIGHT))
+    sums = {}
+    for qs, weight in events:
+        for site_id, at in qs.iterator(chunk_size=10000):
+            sums[site_id] = sums.get(site_id, 0) + weight * 2 ** (half_lives(at) - reference)
+    RollStats.objects.bulk_update([RollStats(site_id=site_id,
+                                             hot_score=reference * math.log(2) + math.log(total))
+                                   for site_id, total in sums.items()
+                                   if total > 0],
+                                  ['hot_score'],
+                                  batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sites', '0002_alter_domain_unique'),
+        ('timeline', '0005_rollstats'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='rollstats',
+            name='timeline_rollstats_rank_idx',
+        ),
+        migrations.AddField(
+            model_name='rollstats',
+            name='hot_score',
+            field=models.FloatField(default=-1000000000.0, editable=False),
+        ),
+        migrations.RunPython(fill_hot_scores, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='rollstats',
+            index=models.Index(fields=['-hot_score', '-posts_count', '-profiles_count'], name='timeline_rollstats_hot_idx'),
+        ),
+    ]
@@ -3,10 +3,18 @@ timeline mixins
 """
 from typing import (
     Any,
+    Dict,
+    List,
     Optional,
 )
 from django.db.models.query import QuerySet
+from django.http import Http404
+from django.utils.translation import gettext_lazy as _
 from .models import Post
+from .pagination import (
+    CursorPage,
+    keyset_filter,
+)
 
 class TimelineViewMixin:
     """
@@ -14,12 +22,16 @@ class TimelineViewMixin:
     """
     slice_kwarg = "slice"
     slice_get_queryset_attr = "get_queryset"
+    before_kwarg = "before"
+    cursor_ordering = ("-created_at", "-pk")
+    kwargs: Dict[str, Any]
 
     def _retrive_slice_value(self) -> Optional[str]:
         qs = getattr(self, self.slice_get_queryset_attr)()
-        if qs.count() == 0:
+        pk = qs.values_list("pk", flat=True).first()
+        if pk is None:
             return None
-        return str(qs[0].pk)
+        return str(pk)
 
     def fill_slice_value(self) -> Optional[str]:
         """
@@ -40,7 +52,11 @@ class TimelineViewMixin:
         slice_value = self.get_slice_value()
         if not slice_value:
             return False
-        return Post.objects.filter(pk__gt=slice_value).count() > 0
+        latest_pk = Post.get_latest_pk(self.request.site.id)  # type: ignore[attr-defined]
+        try:
+            return latest_pk is not None and latest_pk > int(slice_value)
+        except ValueError:
+            return False
 
     def build_sliced_queryset(self, queryset) -> QuerySet[Post]:
         """
@@ -51,12 +67,82 @@ class TimelineViewMixin:
             return queryset
         return queryset.filter(pk__lte=slice_value)
 
+    def get_before_value(self) -> Optional[str]:
+        """
+        get before value, the cursor (post pk) of keyset pagination
+        """
+        return self.request.GET.get(self.before_kwarg)  # type: ignore[attr-defined]
+
+    def get_page_value(self) -> Optional[str]:
+        """
+        get page value
+        """
+        page_kwarg = getattr(self, "page_kwarg", "page")
+        return self.kwargs.get(page_kwarg) \
+            or self.request.GET.get(page_kwarg)  # type: ignore[attr-defined]
+
+    def is_cursor_pagination(self) -> bool:
+        """
+        is cursor pagination?
+
+        offset pagination is kept only for a page requested without cursor
+        """
+        page = self.get_page_value()
+        return bool(self.get_before_value()) or not page or page == "1"
+
+    def get_cursor(self, before: str):
+        """
+        get cursor (created_at, pk) from before value
+        """
+        try:
+            pk = int(before)
+        except ValueError as e:
+            raise Http404(_("Invalid cursor (%(before)s).") % {"before": before}) from e
+        created_at = Post.objects.filter(pk=pk)\
+            .values_list("created_at", flat=True)\
+            .first()
+        if created_at is None:
+            raise Http404(_("Invalid cursor (%(before)s).") % {"before": before})
+        return created_at, pk
+
+    def get_cursor_page_number(self) -> int:
+        """
+        get cursor page number, informative only
+        """
+        try:
+            return int(self.get_page_value() or 1)
+        except ValueError:
+            return 1
+
+    def get_cursor_object_list(self, queryset, limit: int, cursor=None) -> List[Post]:
+        """
+        get cursor object list
+
+        fetches up to limit posts older than the cursor
+        """
+        if cursor:
+            created_at, pk = cursor
+            queryset = keyset_filter(queryset, created_at, pk)
+        return list(queryset.order_by(*self.cursor_ordering)[:limit])
+
+    def build_cursor_page(self, queryset, page_size: int) -> CursorPage:
+        """
+        build cursor page
+
+        fetches page_size + 1 posts older than the cursor, without count and offset
+        """
+        before = self.get_before_value()
+        cursor = self.get_cursor(before) if before else None
+        object_list = self.get_cursor_object_list(queryset, page_size + 1, cursor=cursor)
+        return CursorPage(object_list, page_size, number=self.get_cursor_page_number())
+
     def build_context_data(self):
         """
         build context data
         """
         return {
             "slice_kwarg": self.slice_kwarg,
+            "before_kwarg": self.before_kwarg,
             "slice": self.fill_slice_value(),
             "has_new_post_out_slice": self.fill_has_new_post_out_slice(),
         }
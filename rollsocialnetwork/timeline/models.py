@@ -1,13 +1,69 @@
 """
 timeline models
 """
-from typing import Optional
-from django.db import models
+import math
+import time
+from datetime import (
+    datetime,
+    timedelta,
+    timezone as dt_timezone,
+)
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+)
+from django.conf import settings
+from django.db import (
+    connection,
+    models,
+    transaction,
+)
 from django.contrib.auth.models import User  # pylint: disable=imported-auth-user
+from django.contrib.sites.models import Site
+from django.core.cache import cache
 from django.core.files.storage import storages  # type: ignore[attr-defined]
+from django.db.models.functions import (
+    Abs,
+    Coalesce,
+    Exp,
+    Greatest,
+    Ln,
+)
+from django.db.models.lookups import GreaterThan
 from django.dispatch import receiver  # type: ignore[attr-defined]
+from django.utils import timezone
+from easy_thumbnails.models import Thumbnail  # type: ignore[import-untyped]
+from easy_thumbnails.signals import thumbnail_created  # type: ignore[import-untyped]
+from rollsocialnetwork.sites import site_registry
 from rollsocialnetwork.social.models import UserProfile
 from rollsocialnetwork.watcher import Watcher
+from .pagination import keyset_filter
+
+class PostQuerySet(models.QuerySet):
+    """
+    post queryset
+    """
+    def with_user_like(self, user: User) -> "PostQuerySet":
+        """
+        annotate user_has_like for all posts in a single query
+        """
+        if not user.is_authenticated:
+            return self.annotate(user_has_like=models.Value(False))
+        likes = Like.objects.filter(user_profile__user=user,
+                                    post=models.OuterRef("pk"))
+        return self.annotate(user_has_like=models.Exists(likes))
+
+HOT_SCORE_EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+# hot score of rolls without activity, the log of a zero weight
+HOT_SCORE_MIN = -1e9
+# log(1 + exp(-50)) is below the float precision of the scores
+HOT_SCORE_EXP_CUTOFF = 50
+LATEST_POST_PK_CACHE_KEY = "timeline:latest-post-pk:{site_id}"
+POST_FRAGMENTS_VERSION_CACHE_KEY = "timeline:post-fragments-version:{site_id}"
 
 class Post(models.Model):
     """
@@ -15,6 +71,12 @@ class Post(models.Model):
     """
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=["-created_at", "-id"],
+                         name="timeline_post_cursor_idx"),
+        ]
+
+    objects = PostQuerySet.as_manager()  # type: ignore[django-manager-missing,misc]
 
     user_profile = models.ForeignKey(UserProfile,
                                      on_delete=models.CASCADE,
@@ -27,10 +89,77 @@ class Post(models.Model):
     created_at = models.DateTimeField(auto_now_add=True,
                                       blank=False,
                                       editable=False)
+    likes_count = models.PositiveIntegerField(default=0,
+                                              editable=False)
 
     def __str__(self) -> str:
         return f"Post [{self.user_profile}]"
 
+    @classmethod
+    def get_feed_site_ids(cls, site_id: int) -> List[int]:
+        """
+        get the sites whose timeline shows the posts of a roll
+        """
+        if site_id == settings.HOME_SITE_ID:
+            return [site_id]
+        return [site_id, settings.HOME_SITE_ID]
+
+    @classmethod
+    def get_latest_pk(cls, site_id: int) -> Optional[int]:
+        """
+        get latest post pk of a site timeline
+
+        high-water mark kept in cache and forgotten once a post creation
+        or delete is committed, it is only computed from the database, with
+        a single indexed query, on a cache miss. A read that ran before a
+        commit can cache the previous mark after it was forgotten, so it
+        expires after TIMELINE_LATEST_POST_PK_CACHE_TIMEOUT seconds
+        """
+        key = LATEST_POST_PK_CACHE_KEY.format(site_id=site_id)
+        latest_pk = cache.get(key)
+        if latest_pk is None:
+            qs = cls.objects.all()
+            if site_id != settings.HOME_SITE_ID:
+                qs = qs.filter(user_profile__site_id=site_id)
+            latest_pk = qs.order_by("-pk").values_list("pk", flat=True).first() or 0
+            cache.add(key, latest_pk, timeout=settings.TIMELINE_LATEST_POST_PK_CACHE_TIMEOUT)
+        return latest_pk or None
+
+    @classmethod
+    def forget_latest_pk(cls, site_id: int) -> None:
+        """
+        forget latest post pk high-water mark of site timelines
+        """
+        feed_site_ids = cls.get_feed_site_ids(site_id)
+        cache.delete_many([LATEST_POST_PK_CACHE_KEY.format(site_id=feed_site_id)
+                           for feed_site_id in feed_site_ids])
+        Watcher.forget_values("sites", "latest_post_pk", feed_site_ids)
+
+    @classmethod
+    def get_fragments_version(cls, site_id: int) -> int:
+        """
+        get the post card fragments (timeline/post.html) version of a roll
+
+        fragments vary on it, a new version invalidates every fragment of
+        the roll posts at once
+        """
+        key = POST_FRAGMENTS_VERSION_CACHE_KEY.format(site_id=site_id)
+        version = cache.get(key)
+        if version is None:
+            cache.add(key, time.time_ns(), None)
+            version = cache.get(key)
+        return version
+
+    @classmethod
+    def invalidate_fragments(cls, site_ids: Iterable[int]) -> None:
+        """
+        invalidate the cached post card fragments of rolls
+        """
+        version = time.time_ns()
+        cache.set_many({POST_FRAGMENTS_VERSION_CACHE_KEY.format(site_id=site_id): version
+                        for site_id in site_ids},
+                       None)
+
     def get_like(self, user_profile: UserProfile) -> Optional["Like"]:
         """
         get like
@@ -41,10 +170,12 @@ class Post(models.Model):
         except Like.DoesNotExist:
             return None
 
+    @transaction.atomic
     def _like(self, user_profile: UserProfile):
         return Like.objects.create(user_profile=user_profile,
                                    post=self)
 
+    @transaction.atomic
     def _dislike(self, like: "Like"):
         return like.delete()
 
@@ -58,18 +189,160 @@ class Post(models.Model):
         self._dislike(like)
         return None
 
-    def has_user_like(self, user: User) -> bool:
+    def toggle_like(self, user_profile: UserProfile) -> Tuple[bool, int]:
         """
-        has user like
+        toggle like atomically, returns (has like, likes count)
         """
-        return Like.objects.filter(user_profile__user=user,
-                                   post=self).count() > 0
+        inserted, _deleted, likes_count = self._write_like(user_profile,
+                                                           delete=True,
+                                                           insert=True)
+        return inserted, likes_count
+
+    def set_like(self, user_profile: UserProfile, has_like: bool) -> Tuple[bool, int]:
+        """
+        set like idempotently, returns (has like, likes count)
+        """
+        _inserted, _deleted, likes_count = self._write_like(user_profile,
+                                                           delete=not has_like,
+                                                           insert=has_like)
+        return has_like, likes_count
+
+    def _write_like(self,
+                    user_profile: UserProfile,
+                    delete: bool,
+                    insert: bool) -> Tuple[bool, bool, int]:
+        """
+        delete and/or insert the like, insert only runs when nothing was
+        deleted. Returns (inserted, deleted, likes count).
+
+        PostgreSQL runs delete, insert and counter update in a single
+        statement. SQLite (>= 3.35) runs them with RETURNING inside one
+        transaction. Other databases fall back to the ORM, where the Like
+        signals notify the watcher.
+        """
+        if connection.vendor == "postgresql":
+            result = self._write_like_postgresql(user_profile, delete, insert)
+        elif connection.vendor == "sqlite" \
+                and connection.features.can_return_columns_from_insert:
+            result = self._write_like_sqlite(user_profile, delete, insert)
+        else:
+            return self._write_like_orm(user_profile, delete, insert)
+        inserted, deleted, likes_count = result
+        if inserted:
+            RollStats.add_like_hot_score(self.pk, timezone.now())
+        if inserted or deleted:
+            transaction.on_commit(lambda: Post.notify_likes_count(self.pk, likes_count))
+        return result
+
+    def _write_like_params(self,
+                           user_profile: UserProfile) -> Tuple[int, int, Optional[str]]:
+        liked_at = connection.ops.adapt_datetimefield_value(timezone.now())
+        return self.pk, user_profile.pk, liked_at
+
+    def _write_like_postgresql(self,
+                               user_profile: UserProfile,
+                               delete: bool,
+                               insert: bool) -> Tuple[bool, bool, int]:
+        like_table = Like._meta.db_table
+        post_table = Post._meta.db_table
+        post_pk, user_profile_pk, liked_at = self._write_like_params(user_profile)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                WITH deleted AS (
+                    DELETE FROM {like_table}
+                    WHERE %s AND post_id = %s AND user_profile_id = %s
+                    RETURNING 1
+                ), inserted AS (
+                    INSERT INTO {like_table} (post_id, user_profile_id, liked_at)
+                    SELECT %s::bigint, %s::bigint, %s::timestamptz
+                    WHERE %s AND NOT EXISTS (SELECT 1 FROM deleted)
+                    ON CONFLICT DO NOTHING
+                    RETURNING 1
+                ), updated AS (
+                    UPDATE {post_table}
+                    SET likes_count = GREATEST(likes_count
+                                               + (SELECT COUNT(*) FROM inserted)
+                                               - (SELECT COUNT(*) FROM deleted), 0)
+                    WHERE id = %s
+                    RETURNING likes_count
+                )
+                SELECT EXISTS (SELECT 1 FROM inserted),
+                       EXISTS (SELECT 1 FROM deleted),
+                       (SELECT likes_count FROM updated)
+                """,
+                [delete, post_pk, user_profile_pk,
+                 post_pk, user_profile_pk, liked_at, insert,
+                 post_pk]
+            )
+            inserted, deleted, likes_count = cursor.fetchone()  # type: ignore[misc]
+        return inserted, deleted, likes_count
+
+    def _write_like_sqlite(self,
+                           user_profile: UserProfile,
+                           delete: bool,
+                           insert: bool) -> Tuple[bool, bool, int]:
+        like_table = Like._meta.db_table
+        post_table = Post._meta.db_table
+        post_pk, user_profile_pk, liked_at = self._write_like_params(user_profile)
+        deleted = inserted = 0
+        with transaction.atomic(), connection.cursor() as cursor:
+            if delete:
+                cursor.execute(
+                    f"DELETE FROM {like_table} WHERE post_id = %s AND user_profile_id = %s "
+                    "RETURNING id",
+                    [post_pk, user_profile_pk]
+                )
+                deleted = len(cursor.fetchall())
+            if insert and not deleted:
+                cursor.execute(
+                    f"INSERT INTO {like_table} (post_id, user_profile_id, liked_at) "
+                    "VALUES (%s, %s, %s) ON CONFLICT DO NOTHING RETURNING id",
+                    [post_pk, user_profile_pk, liked_at]
+                )
+                inserted = len(cursor.fetchall())
+            cursor.execute(
+                f"UPDATE {post_table} SET likes_count = MAX(likes_count + %s, 0) "
+                "WHERE id = %s RETURNING likes_count",
+                [inserted - deleted, post_pk]
+            )
+            (likes_count,) = cursor.fetchone()  # type: ignore[misc]
+        return bool(inserted), bool(deleted), likes_count
+
+    def _write_like_orm(self,
+                        user_profile: UserProfile,
+                        delete: bool,
+                        insert: bool) -> Tuple[bool, bool, int]:
+        deleted = inserted = False
+        with transaction.atomic():
+            like = self.get_like(user_profile)
+            if like and delete:
+                self._dislike(like)
+                deleted = True
+            elif not like and insert:
+                self._like(user_profile)
+                inserted = True
+            likes_count = Post.objects.filter(pk=self.pk)\
+                .values_list("likes_count", flat=True)\
+                .get()
+        return inserted, deleted, likes_count
+
+    @classmethod
+    def notify_likes_count(cls, pk: int, likes_count: int) -> None:
+        """
+        notify watcher model:posts, attr:likes_count
+        """
+        Watcher.notify("posts",
+                       "likes_count",
+                       likes_count,
+                       pk=pk)
 
-    def likes_count(self) -> int:
+    def has_user_like(self, user: User) -> bool:
         """
-        likes count
+        has user like
         """
-        return self.likes.count()  # type: ignore[attr-defined]
+        return Like.objects.filter(user_profile__user=user,
+                                   post=self).exists()
 
 class Like(models.Model):
     """
@@ -95,13 +368,442 @@ class Like(models.Model):
     def __str__(self) -> str:
         return f"Like {self.user_profile} at {self.post}"
 
-@receiver([models.signals.post_save,
-           models.signals.post_delete], sender=Like)
-def notify_posts_likes_count(instance, **kwargs):
+class FeedEntry(models.Model):
+    """
+    feed entry model
+
+    materialized timeline, fanned out on post creation to the author roll
+    feed and to the home site feed, trimmed to TIMELINE_FEED_MAX_LENGTH
+    """
+    class Meta:
+        unique_together = [
+            "site",
+            "post",
+        ]
+        indexes = [
+            models.Index(fields=["site", "-created_at", "-post"],
+                         name="timeline_feed_cursor_idx"),
+        ]
+
+    site = models.ForeignKey(Site,
+                             on_delete=models.CASCADE,
+                             blank=False,
+                             related_name="+")
+    post = models.ForeignKey(Post,
+                             on_delete=models.CASCADE,
+                             blank=False,
+                             related_name="feed_entries")
+    created_at = models.DateTimeField(blank=False,
+                                      editable=False)
+
+    def __str__(self) -> str:
+        return f"Feed {self.site} entry {self.post}"
+
+    @classmethod
+    def append(cls, post: Post) -> None:
+        """
+        append post to its feeds
+        """
+        site_ids = Post.get_feed_site_ids(post.user_profile.site_id)  # type: ignore[attr-defined]
+        FeedEntry.objects.bulk_create([FeedEntry(site_id=site_id,
+                                                 post=post,
+                                                 created_at=post.created_at)
+                                       for site_id in site_ids],
+                                      ignore_conflicts=True)
+        for site_id in site_ids:
+            cls.trim(site_id)
+
+    @classmethod
+    def trim(cls, site_id: int, max_length: Optional[int] = None) -> int:
+        """
+        trim feed to its bounded length
+        """
+        if max_length is None:
+            max_length = settings.TIMELINE_FEED_MAX_LENGTH
+        qs = cls.objects.filter(site_id=site_id)
+        boundary = qs.order_by("-created_at", "-post_id")\
+            .values_list("pk", "created_at", "post_id")[max_length:max_length + 1]\
+            .first()
+        if not boundary:
+            return 0
+        pk, created_at, post_id = boundary
+        stale = qs.filter(pk=pk) | keyset_filter(qs, created_at, post_id, pk_field="post_id")
+        deleted, _ = stale.delete()
+        return deleted
+
+    @classmethod
+    def read(cls,
+             site_id: int,
+             limit: int,
+             cursor: Optional[Tuple[datetime, int]] = None,
+             slice_pk: Optional[(str | int)] = None) -> List[int]:
+        """
+        read post pks from feed, newest first
+        """
+        qs: models.QuerySet = cls.objects.filter(site_id=site_id)
+        if slice_pk:
+            qs = qs.filter(post_id__lte=slice_pk)
+        if cursor:
+            created_at, pk = cursor
+            qs = keyset_filter(qs, created_at, pk, pk_field="post_id")
+        return list(qs.order_by("-created_at", "-post_id")
+                    .values_list("post_id", flat=True)[:limit])
+
+class RollStats(models.Model):
+    """
+    roll stats model
+
+    precomputed roll counters, kept up to date on user profile and post
+    creation and delete. hot_posts_count counts the posts of the last
+    HOT_POSTS_SLICE hours, posts leaving the window are aged out by the
+    rebuild_roll_stats --hot-only periodic job.
+
+    hot_score is the log of the posts and likes weights, each one doubled
+    every HOT_SCORE_HALF_LIFE hours since HOT_SCORE_EPOCH. All rolls decay
+    at the same rate, so ordering by the stored score ranks them by their
+    exponentially time-decayed activity at any time, and new events are
+    added with a single UPDATE. Deletes are not subtracted, they fade out
+    and are dropped by the rebuild_hot_scores periodic job
+    """
+    class Meta:
+        indexes = [
+            models.Index(fields=["-hot_score", "-posts_count", "-profiles_count"],
+                         name="timeline_rollstats_hot_idx"),
+        ]
+
+    site = models.OneToOneField(Site,
+                                on_delete=models.CASCADE,
+                                primary_key=True,
+                                related_name="stats")
+    profiles_count = models.PositiveIntegerField(default=0,
+                                                 editable=False)
+    posts_count = models.PositiveIntegerField(default=0,
+                                              editable=False)
+    hot_posts_count = models.PositiveIntegerField(default=0,
+                                                  editable=False)
+    last_activity_at = models.DateTimeField(null=True,
+                                            blank=True,
+                                            editable=False)
+    hot_score = models.FloatField(default=HOT_SCORE_MIN,
+                                  editable=False)
+
+    def __str__(self) -> str:
+        return f"Stats {self.site}"
+
+    @classmethod
+    def get_hot_score_event(cls, weight: float, at: datetime) -> float:
+        """
+        get log-space score of an event weight at a time
+        """
+        half_lives = (at - HOT_SCORE_EPOCH).total_seconds() / 3600 / settings.HOT_SCORE_HALF_LIFE
+        return math.log(weight) + half_lives * math.log(2)
+
+    @classmethod
+    def get_hot_score_add(cls, weight: float, at: datetime) -> models.Expression:
+        """
+        get hot score expression adding an event, log(exp(a) + exp(b))
+        computed as max(a, b) + log(1 + exp(-|a - b|)) so it never overflows.
+        Far apart scores, e.g. HOT_SCORE_MIN, keep the greatest one, exp()
+        raises on underflow in PostgreSQL
+        """
+        event = models.Value(cls.get_hot_score_event(weight, at))
+        hot_score = models.F("hot_score")
+        return models.Case(
+            models.When(GreaterThan(Abs(hot_score - event), HOT_SCORE_EXP_CUTOFF),
+                        then=Greatest(hot_score, event)),
+            default=Greatest(hot_score, event) + Ln(1 + Exp(-Abs(hot_score - event))),
+            output_field=models.FloatField()
+        )
+
+    @classmethod
+    def get_hot_posts_since(cls) -> datetime:
+        """
+        get hot posts window start
+        """
+        return timezone.now() - timedelta(hours=settings.HOT_POSTS_SLICE)
+
+    @classmethod
+    def increment(cls,
+                  site_id: int,
+                  last_activity_at: Optional[datetime] = None,
+                  hot_score_weight: float = 0,
+                  **counters: int) -> None:
+        """
+        add deltas to counters, and the hot score weight of an event at
+        last_activity_at, with a single UPDATE, never below zero.
+        The stats row is created on increments only, decrements of a roll
+        being deleted must not create it again
+        """
+        values: Dict[str, Any] = {field: Greatest(models.F(field) + delta, 0)
+                                  for field, delta in counters.items()}
+        if last_activity_at:
+            values["last_activity_at"] = last_activity_at
+        if hot_score_weight > 0:
+            values["hot_score"] = cls.get_hot_score_add(hot_score_weight,
+                                                        last_activity_at or timezone.now())
+        updated = cls.objects.filter(site_id=site_id).update(**values)
+        if not updated and any(delta > 0 for delta in counters.values()):
+            cls.objects.get_or_create(site_id=site_id)
+            cls.objects.filter(site_id=site_id).update(**values)
+
+    @classmethod
+    def add_like_hot_score(cls, post_id: int, liked_at: datetime) -> None:
+        """
+        add a like weight to the hot score of the post roll
+        """
+        if settings.HOT_SCORE_LIKE_WEIGHT <= 0:
+            return
+        cls.objects.filter(site__profiles__posts=post_id)\
+            .update(hot_score=cls.get_hot_score_add(settings.HOT_SCORE_LIKE_WEIGHT, liked_at))
+
+    @classmethod
+    def get_actual_counters(cls, hot_posts_since: datetime) -> Dict:
+        """
+        get actual counters subqueries
+        """
+        def count(qs, group: str):
+            return Coalesce(models.Subquery(qs.order_by()
+                                            .values(group)
+                                            .annotate(count=models.Count("pk"))
+                                            .values("count")),
+                            0)
+        profiles = UserProfile.objects.filter(site_id=models.OuterRef("site_id"))
+        posts = Post.objects.filter(user_profile__site_id=models.OuterRef("site_id"))
+        return {
+            "profiles_count": count(profiles, "site_id"),
+            "posts_count": count(posts, "user_profile__site_id"),
+            "hot_posts_count": count(posts.filter(created_at__gte=hot_posts_since),
+                                     "user_profile__site_id"),
+        }
+
+    @classmethod
+    def rebuild(cls) -> int:
+        """
+        recount all counters, creating missing stats rows
+        """
+        site_ids = Site.objects.values_list("pk", flat=True)
+        RollStats.objects.bulk_create([RollStats(site_id=site_id) for site_id in site_ids],
+                                      ignore_conflicts=True)
+        last_activity_at = Post.objects.filter(user_profile__site_id=models.OuterRef("site_id"))\
+            .order_by("-created_at")\
+            .values("created_at")[:1]
+        return cls.objects.update(last_activity_at=models.Subquery(last_activity_at),
+                                  **cls.get_actual_counters(cls.get_hot_posts_since()))
+
+    @classmethod
+    def age_hot_posts(cls) -> int:
+        """
+        recount hot posts of the rolls with hot posts, the window only
+        loses posts as time goes by
+        """
+        hot_posts_count = cls.get_actual_counters(cls.get_hot_posts_since())["hot_posts_count"]
+        return cls.objects.filter(hot_posts_count__gt=0)\
+            .update(hot_posts_count=hot_posts_count)
+
+def get_post_site_id(post: Post) -> Optional[int]:
+    """
+    get post site id, None when the user profile is already deleted
+    """
+    try:
+        return post.user_profile.site_id  # type: ignore[attr-defined]
+    except UserProfile.DoesNotExist:
+        return None
+
+@receiver(models.signals.post_save, sender=Post)
+def append_post_to_feeds(instance, created, raw=False, **kwargs):
+    """
+    fan out post to feeds on creation
+    """
+    if not created or raw:
+        return
+    FeedEntry.append(instance)
+
+@receiver(models.signals.post_save, sender=Post)
+def forget_created_latest_post_pk(instance, created, raw=False, **kwargs):
+    """
+    forget latest post pk once the created post is committed, it is
+    recomputed on next read. Bumping the cached pk is a read-compare-write
+    that concurrent posts could leave on the lower pk
+    """
+    if not created or raw:
+        return
+    site_id = instance.user_profile.site_id
+    transaction.on_commit(lambda: Post.forget_latest_pk(site_id))
+
+@receiver(models.signals.post_delete, sender=Post)
+def forget_latest_post_pk(instance, **kwargs):
+    """
+    forget latest post pk on delete, again once committed so a concurrent
+    read can not cache the deleted pk. It is recomputed on next read
+    """
+    try:
+        site_id = instance.user_profile.site_id
+    except UserProfile.DoesNotExist:
+        # deleted by cascade, the roll timeline is gone too
+        site_id = settings.HOME_SITE_ID
+    Post.forget_latest_pk(site_id)
+    transaction.on_commit(lambda: Post.forget_latest_pk(site_id))
+
+@receiver(models.signals.post_save, sender=Post)
+def invalidate_post_fragments(instance, created, raw=False, **kwargs):
+    """
+    invalidate post card fragments of an updated post, a created post
+    has no fragment yet
+    """
+    if created or raw:
+        return
+    Post.invalidate_fragments([instance.user_profile.site_id])
+
+@receiver(models.signals.post_save, sender=UserProfile)
+def invalidate_user_profile_post_fragments(instance, created, raw=False, **kwargs):
+    """
+    invalidate post card fragments of a user profile, they show its username
+    """
+    if created or raw:
+        return
+    Post.invalidate_fragments([instance.site_id])
+
+@receiver(models.signals.post_save, sender=Site)
+def invalidate_site_post_fragments(instance, created, raw=False, **kwargs):
     """
-    notify watcher model:posts, attr:likes_count
+    invalidate post card fragments of a roll, they show its domain
     """
-    Watcher.notify("posts",
-                   "likes_count",
-                   instance.post.likes_count(),
-                   pk=instance.post.pk)
+    if created or raw:
+        return
+    Post.invalidate_fragments([instance.pk])
+
+@receiver(thumbnail_created)
+def invalidate_thumbnail_post_fragments(sender, **kwargs):
+    """
+    invalidate post card fragments of a regenerated thumbnail source
+    """
+    source_names = Thumbnail.objects.filter(name=sender.name)\
+        .values_list("source__name", flat=True)
+    site_ids = set(Post.objects.filter(photo__in=list(source_names))
+                   .values_list("user_profile__site_id", flat=True))
+    if site_ids:
+        Post.invalidate_fragments(site_ids)
+
+@receiver(models.signals.post_save, sender=Site)
+def create_roll_stats(instance, created, raw=False, **kwargs):
+    """
+    create roll stats on site creation
+    """
+    if not created or raw:
+        return
+    RollStats.objects.get_or_create(site=instance)
+
+@receiver(models.signals.post_save, sender=UserProfile)
+def increment_roll_profiles_count(instance, created, raw=False, **kwargs):
+    """
+    increment roll profiles count on user profile creation
+    """
+    if not created or raw:
+        return
+    RollStats.increment(instance.site_id,
+                        last_activity_at=timezone.now(),
+                        profiles_count=1)
+
+@receiver(models.signals.post_delete, sender=UserProfile)
+def decrement_roll_profiles_count(instance, **kwargs):
+    """
+    decrement roll profiles count on user profile delete
+    """
+    RollStats.increment(instance.site_id, profiles_count=-1)
+
+@receiver(models.signals.post_save, sender=Post)
+def increment_roll_posts_count(instance, created, raw=False, **kwargs):
+    """
+    increment roll posts and hot posts count on post creation
+    """
+    if not created or raw:
+        return
+    RollStats.increment(instance.user_profile.site_id,
+                        last_activity_at=instance.created_at,
+                        hot_score_weight=settings.HOT_SCORE_POST_WEIGHT,
+                        posts_count=1,
+                        hot_posts_count=1)
+
+@receiver(models.signals.post_delete, sender=Post)
+def decrement_roll_posts_count(instance, **kwargs):
+    """
+    decrement roll posts count on post delete, and hot posts count when
+    the post is still in the window
+    """
+    site_id = get_post_site_id(instance)
+    if site_id is None:
+        return
+    counters = {"posts_count": -1}
+    if instance.created_at >= RollStats.get_hot_posts_since():
+        counters["hot_posts_count"] = -1
+    RollStats.increment(site_id, **counters)
+
+@receiver(models.signals.post_save, sender=Like)
+def increment_posts_likes_count(instance, created, raw=False, **kwargs):
+    """
+    increment post likes count in the same transaction of the like insert
+    """
+    if not created or raw:
+        return
+    Post.objects.filter(pk=instance.post_id)\
+        .update(likes_count=models.F("likes_count") + 1)
+
+@receiver(models.signals.post_save, sender=Like)
+def add_like_roll_hot_score(instance, created, raw=False, **kwargs):
+    """
+    add like weight to the roll hot score on like creation
+    """
+    if not created or raw:
+        return
+    RollStats.add_like_hot_score(instance.post_id, instance.liked_at)
+
+@receiver(models.signals.post_delete, sender=Like)
+def decrement_posts_likes_count(instance, **kwargs):
+    """
+    decrement post likes count in the same transaction of the like delete
+    """
+    Post.objects.filter(pk=instance.post_id, likes_count__gt=0)\
+        .update(likes_count=models.F("likes_count") - 1)
+
+def load_posts_likes_count(pks: List) -> Dict[int, int]:
+    """
+    load watcher model:posts, attr:likes_count values
+    """
+    return dict(Post.objects.filter(pk__in=pks).values_list("pk", "likes_count"))
+
+def load_sites_latest_post_pk(pks: List) -> Dict[int, Optional[int]]:
+    """
+    load watcher model:sites, attr:latest_post_pk values
+    """
+    site_ids = [int(pk) for pk in pks]
+    return {site_id: Post.get_latest_pk(site_id)
+            for site_id in site_ids
+            if site_id in site_registry}
+
+def like_post_pks(instance: Like, **kwargs) -> List[int]:
+    """
+    like post pks, likes change the post likes count
+    """
+    return [instance.post_id]
+
+def post_site_pks(instance: Post, created: bool = True, **kwargs) -> List[int]:
+    """
+    post site pks, created and deleted posts change the sites latest post pk
+    """
+    if not created:
+        return []
+    try:
+        site_id = instance.user_profile.site_id  # type: ignore[attr-defined]
+    except UserProfile.DoesNotExist:
+        site_id = settings.HOME_SITE_ID
+    return Post.get_feed_site_ids(site_id)
+
+Watcher.watch("posts", "likes_count",
+              code=1,
+              loader=load_posts_likes_count,
+              triggers={Like: like_post_pks})
+
+Watcher.watch("sites", "latest_post_pk",
+              code=2,
+              loader=load_sites_latest_post_pk,
+              triggers={Post: post_site_pks})
@@ -0,0 +1,93 @@
+"""
+timeline pagination
+"""
+from datetime import datetime
+from typing import (
+    Any,
+    List,
+    Optional,
+)
+from django.db.models import Q
+from django.db.models.query import QuerySet
+
+def keyset_filter(queryset: QuerySet,
+                  created_at: datetime,
+                  pk: int,
+                  created_at_field: str = "created_at",
+                  pk_field: str = "pk") -> QuerySet:
+    """
+    keyset filter
+
+    keeps rows older than the (created_at, pk) cursor, matching the
+    ("-created_at", "-pk") ordering
+    """
+    return queryset.filter(
+        Q(**{f"{created_at_field}__lt": created_at})
+        | Q(**{created_at_field: created_at, f"{pk_field}__lt": pk})
+    )
+
+class CursorPage:
+    """
+    cursor page
+
+    Page-like object used by the timeline templates. It is built from
+    page_size + 1 rows, so there is no COUNT(*) and no OFFSET.
+    """
+    def __init__(self,
+                 object_list: List[Any],
+                 page_size: int,
+                 number: int = 1) -> None:
+        self._has_next = len(object_list) > page_size
+        self.object_list = object_list[:page_size]
+        self.number = number
+
+    def __repr__(self) -> str:
+        return f"<CursorPage {self.number}>"
+
+    def __len__(self) -> int:
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self) -> bool:
+        """
+        has next
+        """
+        return self._has_next
+
+    def has_previous(self) -> bool:
+        """
+        has previous
+        """
+        return self.number > 1
+
+    def has_other_pages(self) -> bool:
+        """
+        has other pages
+        """
+        return self.has_previous() or self.has_next()
+
+    def next_page_number(self) -> int:
+        """
+        next page number
+        """
+        return self.number + 1
+
+    def previous_page_number(self) -> int:
+        """
+        previous page number
+        """
+        return self.number - 1
+
+    @property
+    def next_cursor(self) -> Optional[int]:
+        """
+        next cursor, the pk of the last post of this page
+        """
+        if not self._has_next:
+            return None
+        return self.object_list[-1].pk
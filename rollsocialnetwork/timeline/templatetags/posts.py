@@ -15,14 +15,27 @@ register = template.Library()
 def has_user_like(post: Post, user: User) -> bool:
     """
     has like
+
+    reads the user_has_like annotation (see PostQuerySet.with_user_like)
+    and only queries when the post was not annotated
     """
+    user_has_like = getattr(post, "user_has_like", None)
+    if user_has_like is not None:
+        return user_has_like
     return post.has_user_like(user)
 
 def is_external_post(post: Post, site: Site):
     """
     is external post
     """
-    return post.user_profile.site.pk != site.pk
+    return post.user_profile.site_id != site.pk  # type: ignore[attr-defined]
+
+def fragments_version(post: Post) -> int:
+    """
+    fragments version of the post roll
+    """
+    return Post.get_fragments_version(post.user_profile.site_id)  # type: ignore[attr-defined]
 
 register.filter("has_user_like", has_user_like)
 register.filter("is_external_post", is_external_post)
+register.filter("fragments_version", fragments_version)
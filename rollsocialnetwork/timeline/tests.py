@@ -1,14 +1,41 @@
 """
 timeline tests
 """
+import math
+from datetime import timedelta
+from io import StringIO
 from unittest import mock
-from django.test import TestCase
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.conf import settings
+from django.db import connection
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.template.loader import render_to_string
+from django.test import (
+    RequestFactory,
+    TestCase,
+    override_settings,
+)
 from django.http import HttpResponseRedirect
 from rollsocialnetwork.social.tests_factory import UserProfileFactory
 from rollsocialnetwork.tests_factory import SiteFactory
-from rollsocialnetwork.timeline.models import Like, Post
+from rollsocialnetwork.timeline.models import (
+    LATEST_POST_PK_CACHE_KEY,
+    HOT_SCORE_MIN,
+    FeedEntry,
+    Like,
+    Post,
+    RollStats,
+)
+from rollsocialnetwork.utils import get_popular_rolls
+from rollsocialnetwork.watcher import Watcher
+from .management.commands.rebuild_hot_scores import Command as RebuildHotScoresCommand
 from .mixins import TimelineViewMixin
+from .pagination import CursorPage
+from .templatetags.posts import has_user_like
 from .tests_factory import PostFactory
+from .views import TimelineView
 
 class TimelineViewMixinTest(TestCase):
     """
@@ -16,6 +43,7 @@ class TimelineViewMixinTest(TestCase):
     """
     def setUp(self):
         self.post_factory = PostFactory()
+        cache.clear()
 
     def _get_queryset(self):
         return []
@@ -50,10 +78,88 @@ class TimelineViewMixinTest(TestCase):
         post_1 = self.post_factory.create_post()
         get_slice_value_mock.return_value = post_1.pk
         mixin = TimelineViewMixin()
+        mixin.request = mock.MagicMock()
+        mixin.request.site.id = settings.HOME_SITE_ID
         self.assertFalse(mixin.fill_has_new_post_out_slice())
-        _post_2 = self.post_factory.create_post()
+        with self.captureOnCommitCallbacks(execute=True):
+            _post_2 = self.post_factory.create_post()
         self.assertTrue(mixin.fill_has_new_post_out_slice())
 
+    @mock.patch.object(TimelineViewMixin, 'get_slice_value')
+    def test_fill_has_new_post_out_slice_scoped_to_roll(self, get_slice_value_mock):
+        """
+        test fill has new post out slice ignores other rolls without queries
+        """
+        post_1 = self.post_factory.create_post()
+        get_slice_value_mock.return_value = post_1.pk
+        mixin = TimelineViewMixin()
+        mixin.request = mock.MagicMock()
+        mixin.request.site.id = post_1.user_profile.site_id
+        self.assertFalse(mixin.fill_has_new_post_out_slice())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post_factory.create_post()
+        with self.assertNumQueries(0):
+            self.assertFalse(mixin.fill_has_new_post_out_slice())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post_factory.create_post(user_profile=post_1.user_profile)
+        # recomputed by the watcher refresh on commit
+        with self.assertNumQueries(0):
+            self.assertTrue(mixin.fill_has_new_post_out_slice())
+
+    @mock.patch("rollsocialnetwork.timeline.models.Watcher.notify")
+    def test_latest_pk_notified_on_commit(self, notify_mock):
+        """
+        test new posts are notified to roll and home watchers after commit
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            post = self.post_factory.create_post()
+        notify_mock.assert_has_calls([
+            mock.call("sites", "latest_post_pk", post.pk, pk=post.user_profile.site_id),
+            mock.call("sites", "latest_post_pk", post.pk, pk=settings.HOME_SITE_ID),
+        ])
+
+    def test_latest_pk_concurrent_posts(self):
+        """
+        test the latest pk cached by a read before a post commit is forgotten
+        once it commits
+        """
+        post_1 = self.post_factory.create_post()
+        site_id = post_1.user_profile.site_id
+        with self.captureOnCommitCallbacks() as callbacks:
+            post_2 = self.post_factory.create_post(user_profile=post_1.user_profile)
+        # read before the post_2 commit caches a pk
+        Post.get_latest_pk(site_id)
+        self.assertIsNotNone(cache.get(LATEST_POST_PK_CACHE_KEY.format(site_id=site_id)))
+        for callback in callbacks:
+            callback()
+        self.assertEqual(Post.get_latest_pk(site_id), post_2.pk)
+
+    def test_latest_pk_cache_timeout(self):
+        """
+        test a stale latest pk cached after the post commit expires
+        """
+        post_1 = self.post_factory.create_post()
+        site_id = post_1.user_profile.site_id
+        cache.clear()
+        with override_settings(TIMELINE_LATEST_POST_PK_CACHE_TIMEOUT=60), \
+                mock.patch.object(cache, "add", wraps=cache.add) as add_mock:
+            Post.get_latest_pk(site_id)
+        add_mock.assert_called_once_with(LATEST_POST_PK_CACHE_KEY.format(site_id=site_id),
+                                         post_1.pk,
+                                         timeout=60)
+
+    def test_latest_pk_cache_miss_and_delete(self):
+        """
+        test latest pk is recomputed after a cache miss or a delete
+        """
+        post_1 = self.post_factory.create_post()
+        post_2 = self.post_factory.create_post(user_profile=post_1.user_profile)
+        site_id = post_1.user_profile.site_id
+        cache.clear()
+        self.assertEqual(Post.get_latest_pk(site_id), post_2.pk)
+        post_2.delete()
+        self.assertEqual(Post.get_latest_pk(site_id), post_1.pk)
+
     @mock.patch.object(TimelineViewMixin, 'fill_slice_value', return_value=None)
     @mock.patch.object(TimelineViewMixin, 'fill_has_new_post_out_slice', return_value=None)
     def test_build_context_data_comportament(self,
@@ -65,9 +171,294 @@ class TimelineViewMixinTest(TestCase):
         mixin = TimelineViewMixin()
         context_data = mixin.build_context_data()
         self.assertIn("slice_kwarg", context_data.keys())
+        self.assertIn("before_kwarg", context_data.keys())
         self.assertIn("slice", context_data.keys())
         self.assertIn("has_new_post_out_slice", context_data.keys())
 
+class TimelineViewCursorPaginationTest(TestCase):
+    """
+    timeline view cursor pagination test
+    """
+    def setUp(self):
+        user_profile_factory = UserProfileFactory()
+        site_factory = SiteFactory()
+        post_factory = PostFactory()
+        self.site = site_factory.create_site()
+        self.user_profile = user_profile_factory.create_user_profile(site=self.site)
+        self.posts = [post_factory.create_post(user_profile=self.user_profile)
+                      for _ in range(3)]
+        self.client.force_login(self.user_profile.user)
+
+    def get(self, path):
+        """
+        get timeline fragment
+        """
+        return self.client.get(path,
+                               SERVER_NAME=self.site.domain,
+                               headers={"AJAX-Request": "true"})
+
+    @mock.patch.object(TimelineView, "paginate_by", 2)
+    def test_cursor_pages(self):
+        """
+        test cursor pages walk the timeline without paginator
+        """
+        response = self.get("/t/")
+        page = response.context["posts_page"]
+        self.assertIsInstance(page, CursorPage)
+        self.assertIsNone(response.context["paginator"])
+        self.assertEqual([post.pk for post in page],
+                         [self.posts[2].pk, self.posts[1].pk])
+        self.assertTrue(page.has_next())
+        self.assertEqual(page.next_cursor, self.posts[1].pk)
+        response = self.get(f"/t/?before={page.next_cursor}&page=2")
+        page = response.context["posts_page"]
+        self.assertEqual([post.pk for post in page], [self.posts[0].pk])
+        self.assertEqual(page.number, 2)
+        self.assertFalse(page.has_next())
+
+    @mock.patch.object(TimelineView, "paginate_by", 2)
+    def test_offset_page_kept(self):
+        """
+        test page requested without cursor still uses the paginator
+        """
+        response = self.get("/t/?page=2")
+        self.assertIsNotNone(response.context["paginator"])
+        self.assertEqual([post.pk for post in response.context["posts_page"]],
+                         [self.posts[0].pk])
+
+    def test_invalid_cursor(self):
+        """
+        test invalid cursor returns not found
+        """
+        response = self.get("/t/?before=abc")
+        self.assertEqual(response.status_code, 404)
+
+class FeedEntryTest(TestCase):
+    """
+    feed entry test
+    """
+    def setUp(self):
+        user_profile_factory = UserProfileFactory()
+        site_factory = SiteFactory()
+        self.post_factory = PostFactory()
+        self.site = site_factory.create_site()
+        self.user_profile = user_profile_factory.create_user_profile(site=self.site)
+
+    def test_post_fan_out(self):
+        """
+        test post is appended to roll and home feeds
+        """
+        post = self.post_factory.create_post(user_profile=self.user_profile)
+        self.assertEqual(FeedEntry.read(self.site.pk, 10), [post.pk])
+        self.assertEqual(FeedEntry.read(settings.HOME_SITE_ID, 10), [post.pk])
+
+    @override_settings(TIMELINE_FEED_MAX_LENGTH=2)
+    def test_trim(self):
+        """
+        test feed is trimmed to its bounded length
+        """
+        posts = [self.post_factory.create_post(user_profile=self.user_profile)
+                 for _ in range(3)]
+        self.assertEqual(FeedEntry.read(self.site.pk, 10),
+                         [posts[2].pk, posts[1].pk])
+
+    def test_read_cursor(self):
+        """
+        test read pages through the feed by cursor
+        """
+        posts = [self.post_factory.create_post(user_profile=self.user_profile)
+                 for _ in range(3)]
+        cursor = (posts[1].created_at, posts[1].pk)
+        self.assertEqual(FeedEntry.read(self.site.pk, 10, cursor=cursor), [posts[0].pk])
+        self.assertEqual(FeedEntry.read(self.site.pk, 10, slice_pk=posts[1].pk),
+                         [posts[1].pk, posts[0].pk])
+
+    def test_rebuild_feeds_command(self):
+        """
+        test rebuild feeds command backfills from posts
+        """
+        post = self.post_factory.create_post(user_profile=self.user_profile)
+        FeedEntry.objects.all().delete()
+        call_command("rebuild_feeds", site_ids=[self.site.pk], stdout=StringIO())
+        self.assertEqual(FeedEntry.read(self.site.pk, 10), [post.pk])
+        self.assertEqual(FeedEntry.read(settings.HOME_SITE_ID, 10), [])
+
+class RollStatsTest(TestCase):
+    """
+    roll stats test
+    """
+    def setUp(self):
+        self.user_profile_factory = UserProfileFactory()
+        self.post_factory = PostFactory()
+        self.site = SiteFactory().create_site()
+        self.user_profile = self.user_profile_factory.create_user_profile(site=self.site)
+
+    def get_counters(self):
+        """
+        get site counters
+        """
+        return RollStats.objects.filter(site=self.site)\
+            .values_list("profiles_count", "posts_count", "hot_posts_count")\
+            .get()
+
+    def test_incremental(self):
+        """
+        test counters follow profile and post creation and delete
+        """
+        post = self.post_factory.create_post(user_profile=self.user_profile)
+        latest_post = self.post_factory.create_post(user_profile=self.user_profile)
+        self.assertEqual(self.get_counters(), (1, 2, 2))
+        self.assertEqual(RollStats.objects.get(site=self.site).last_activity_at,
+                         latest_post.created_at)
+        post.delete()
+        self.assertEqual(self.get_counters(), (1, 1, 1))
+        self.user_profile.delete()
+        self.assertEqual(self.get_counters(), (0, 0, 0))
+
+    def test_old_post_delete(self):
+        """
+        test deleting a post out of the window keeps the hot posts count
+        """
+        post = self.post_factory.create_post(user_profile=self.user_profile)
+        self.post_factory.create_post(user_profile=self.user_profile)
+        Post.objects.filter(pk=post.pk)\
+            .update(created_at=RollStats.get_hot_posts_since() - timedelta(hours=1))
+        RollStats.age_hot_posts()
+        self.assertEqual(self.get_counters(), (1, 2, 1))
+        Post.objects.get(pk=post.pk).delete()
+        self.assertEqual(self.get_counters(), (1, 1, 1))
+
+    def test_site_delete(self):
+        """
+        test site delete cascades without recreating its stats
+        """
+        self.post_factory.create_post(user_profile=self.user_profile)
+        self.site.delete()
+        self.assertFalse(RollStats.objects.filter(site_id=self.site.pk).exists())
+
+    def test_rebuild_roll_stats_command(self):
+        """
+        test rebuild roll stats command recounts, --hot-only ages the window
+        """
+        post = self.post_factory.create_post(user_profile=self.user_profile)
+        RollStats.objects.filter(site=self.site).delete()
+        call_command("rebuild_roll_stats", stdout=StringIO())
+        self.assertEqual(self.get_counters(), (1, 1, 1))
+        Post.objects.filter(pk=post.pk)\
+            .update(created_at=RollStats.get_hot_posts_since() - timedelta(hours=1))
+        call_command("rebuild_roll_stats", hot_only=True, stdout=StringIO())
+        self.assertEqual(self.get_counters(), (1, 1, 0))
+
+    def get_hot_score(self, site=None):
+        """
+        get site hot score
+        """
+        return RollStats.objects.filter(site=site or self.site)\
+            .values_list("hot_score", flat=True)\
+            .get()
+
+    def test_hot_score(self):
+        """
+        test hot score adds posts and likes in log space
+        """
+        self.assertEqual(self.get_hot_score(), HOT_SCORE_MIN)
+        post = self.post_factory.create_post(user_profile=self.user_profile)
+        post_score = RollStats.get_hot_score_event(settings.HOT_SCORE_POST_WEIGHT, post.created_at)
+        self.assertAlmostEqual(self.get_hot_score(), post_score)
+        post.toggle_like(self.user_profile)
+        like_score = RollStats.get_hot_score_event(settings.HOT_SCORE_LIKE_WEIGHT,
+                                                   Like.objects.get(post=post).liked_at)
+        hot_score = math.log(math.exp(post_score - like_score) + 1) + like_score
+        self.assertAlmostEqual(self.get_hot_score(), hot_score, places=3)
+
+    def test_hot_score_first_event(self):
+        """
+        test adding an event to a roll at HOT_SCORE_MIN does not evaluate an
+        underflowing exp(), PostgreSQL raises on it
+        """
+        def strict_exp(value):
+            if value < -745:
+                raise ValueError("value out of range: underflow")
+            return math.exp(value)
+        connection.ensure_connection()
+        connection.connection.create_function("EXP", 1, strict_exp, deterministic=True)
+        self.addCleanup(connection.connection.create_function,
+                        "EXP", 1, math.exp, deterministic=True)
+        self.assertEqual(self.get_hot_score(), HOT_SCORE_MIN)
+        post = self.post_factory.create_post(user_profile=self.user_profile)
+        post_score = RollStats.get_hot_score_event(settings.HOT_SCORE_POST_WEIGHT, post.created_at)
+        self.assertAlmostEqual(self.get_hot_score(), post_score)
+        post.toggle_like(self.user_profile)
+        self.assertGreater(self.get_hot_score(), post_score)
+
+    def test_hot_score_decay(self):
+        """
+        test older activity ranks below newer one
+        """
+        other_site = SiteFactory().create_site()
+        other_user_profile = self.user_profile_factory.create_user_profile(site=other_site)
+        posts = [self.post_factory.create_post(user_profile=other_user_profile) for _ in range(3)]
+        self.post_factory.create_post(user_profile=self.user_profile)
+        half_life = timedelta(hours=settings.HOT_SCORE_HALF_LIFE)
+        RollStats.objects.filter(site=other_site).update(hot_score=HOT_SCORE_MIN)
+        for post in posts:
+            RollStats.increment(other_site.pk,
+                                last_activity_at=post.created_at - half_life * 2,
+                                hot_score_weight=settings.HOT_SCORE_POST_WEIGHT)
+        self.assertAlmostEqual(self.get_hot_score(other_site),
+                               self.get_hot_score() + math.log(3 / 4),
+                               places=3)
+        rolls = list(get_popular_rolls().filter(pk__in=[self.site.pk, other_site.pk]))
+        self.assertEqual(rolls, [self.site, other_site])
+
+    def test_rebuild_hot_scores_command(self):
+        """
+        test rebuild hot scores command matches the incremental scores
+        """
+        for _ in range(3):
+            post = self.post_factory.create_post(user_profile=self.user_profile)
+            post.toggle_like(self.user_profile)
+        empty_site = SiteFactory().create_site()
+        hot_score = self.get_hot_score()
+        RollStats.objects.filter(site__in=[self.site, empty_site]).update(hot_score=0)
+        call_command("rebuild_hot_scores", "--chunk-size", "2", stdout=StringIO())
+        self.assertAlmostEqual(self.get_hot_score(), hot_score, places=3)
+        self.assertEqual(self.get_hot_score(empty_site), HOT_SCORE_MIN)
+        with self.assertRaises(CommandError):
+            call_command("rebuild_hot_scores", "--chunk-size", "0", stdout=StringIO())
+
+    def test_rebuild_hot_scores_command_skips_updated(self):
+        """
+        test rebuild hot scores command keeps an increment landed meanwhile
+        """
+        get_hot_scores = RebuildHotScoresCommand.get_hot_scores
+        def get_hot_scores_then_post(command, *args):
+            hot_scores = get_hot_scores(command, *args)
+            self.post_factory.create_post(user_profile=self.user_profile)
+            return hot_scores
+        stdout = StringIO()
+        with mock.patch.object(RebuildHotScoresCommand, "get_hot_scores", autospec=True,
+                               side_effect=get_hot_scores_then_post):
+            call_command("rebuild_hot_scores", stdout=stdout)
+        self.assertIn("1 skipped", stdout.getvalue())
+        self.assertGreater(self.get_hot_score(), HOT_SCORE_MIN)
+
+    def test_popular_rolls(self):
+        """
+        test popular rolls sort on stats, without join fan-out
+        """
+        other_site = SiteFactory().create_site()
+        for _ in range(2):
+            self.user_profile_factory.create_user_profile(site=other_site)
+        self.post_factory.create_post(user_profile=self.user_profile)
+        self.post_factory.create_post(user_profile=self.user_profile)
+        with self.assertNumQueries(1):
+            rolls = list(get_popular_rolls().filter(pk__in=[self.site.pk, other_site.pk]))
+        self.assertEqual(rolls, [self.site, other_site])
+        self.assertEqual((rolls[0].profiles_count, rolls[0].posts_count, rolls[0].hot_posts_count),
+                         (1, 2, 2))
+        self.assertEqual(rolls[1].profiles_count, 2)
+
 class PostLikeDislikeTest(TestCase):
     """
     post like dislike test
@@ -97,6 +488,206 @@ class PostLikeDislikeTest(TestCase):
         self.assertEqual(like.post, post)
         self.assertIsNone(post.like_dislike(self.user_profile))
 
+class PostLikesCountTest(TestCase):
+    """
+    post likes count test
+    """
+    def setUp(self):
+        self.user_profile_factory = UserProfileFactory()
+        self.post_factory = PostFactory()
+
+    def test_likes_count_follows_like_dislike(self):
+        """
+        test likes count is incremented and decremented
+        """
+        post = self.post_factory.create_post()
+        user_profile_1 = self.user_profile_factory.create_user_profile()
+        user_profile_2 = self.user_profile_factory.create_user_profile()
+        post.like_dislike(user_profile_1)
+        post.like_dislike(user_profile_2)
+        post.refresh_from_db()
+        self.assertEqual(post.likes_count, 2)
+        post.like_dislike(user_profile_1)
+        post.refresh_from_db()
+        self.assertEqual(post.likes_count, 1)
+
+    def test_rebuild_likes_count_command(self):
+        """
+        test rebuild likes count command fixes drift
+        """
+        post = self.post_factory.create_post()
+        post.like_dislike(self.user_profile_factory.create_user_profile())
+        Post.objects.filter(pk=post.pk).update(likes_count=5)
+        with self.assertRaises(CommandError):
+            call_command("rebuild_likes_count", check=True, stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.likes_count, 5)
+        call_command("rebuild_likes_count", chunk_size=1, stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.likes_count, 1)
+        call_command("rebuild_likes_count", check=True, stdout=StringIO())
+
+class WatcherSnapshotTest(TestCase):
+    """
+    watcher snapshot test
+    """
+    def setUp(self):
+        self.user_profile_factory = UserProfileFactory()
+        self.post_factory = PostFactory()
+        cache.clear()
+
+    def test_snapshot_loads_misses_in_bulk(self):
+        """
+        test snapshot loads misses in one query and stores them
+        """
+        post_1 = self.post_factory.create_post()
+        post_2 = self.post_factory.create_post()
+        Post.objects.filter(pk=post_2.pk).update(likes_count=3)
+        refs = [("posts", "likes_count", str(post_1.pk)),
+                ("posts", "likes_count", str(post_2.pk))]
+        with self.assertNumQueries(1):
+            snapshot = Watcher.get_snapshot(refs)
+        self.assertEqual({message["pk"]: message["likes_count"] for message in snapshot},
+                         {str(post_1.pk): 0, str(post_2.pk): 3})
+        with self.assertNumQueries(0):
+            self.assertEqual(len(Watcher.get_snapshot(refs)), 2)
+
+    def test_snapshot_ignores_invalid_pks(self):
+        """
+        test snapshot ignores invalid and missing pks
+        """
+        snapshot = Watcher.get_snapshot([("posts", "likes_count", "abc"),
+                                         ("posts", "likes_count", "0")])
+        self.assertEqual(snapshot, [])
+
+    @mock.patch.object(Watcher, "get_notifier")
+    def test_notify_stores_value(self, _get_notifier_mock):
+        """
+        test notify keeps the stored value up to date
+        """
+        post = self.post_factory.create_post()
+        with self.captureOnCommitCallbacks(execute=True):
+            post.toggle_like(self.user_profile_factory.create_user_profile())
+        Post.objects.filter(pk=post.pk).update(likes_count=10)
+        snapshot = Watcher.get_snapshot([("posts", "likes_count", post.pk)])
+        self.assertEqual(snapshot[0]["likes_count"], 1)
+
+    @mock.patch.object(Watcher, "notify")
+    def test_like_trigger_refreshes_on_commit(self, notify_mock):
+        """
+        test like save and delete refresh the post likes count after commit
+        """
+        post = self.post_factory.create_post()
+        user_profile = self.user_profile_factory.create_user_profile()
+        with self.captureOnCommitCallbacks(execute=True):
+            like = Like.objects.create(post=post, user_profile=user_profile)
+            notify_mock.assert_not_called()
+        notify_mock.assert_called_once_with("posts", "likes_count", 1, pk=post.pk)
+        notify_mock.reset_mock()
+        with self.captureOnCommitCallbacks(execute=True):
+            like.delete()
+        notify_mock.assert_called_once_with("posts", "likes_count", 0, pk=post.pk)
+
+    def test_sites_latest_post_pk(self):
+        """
+        test sites latest post pk snapshot is forgotten on post delete
+        """
+        post = self.post_factory.create_post()
+        site_id = post.user_profile.site_id
+        refs = [("sites", "latest_post_pk", site_id)]
+        self.assertEqual(Watcher.get_snapshot(refs)[0]["latest_post_pk"], post.pk)
+        post.delete()
+        self.assertIsNone(Watcher.get_snapshot(refs)[0]["latest_post_pk"])
+
+class PostWithUserLikeTest(TestCase):
+    """
+    post with user like test
+    """
+    def setUp(self):
+        self.user_profile_factory = UserProfileFactory()
+        self.post_factory = PostFactory()
+        self.user_profile = self.user_profile_factory.create_user_profile()
+
+    def test_with_user_like_annotation(self):
+        """
+        test with user like annotates the whole queryset
+        """
+        liked_post = self.post_factory.create_post()
+        other_post = self.post_factory.create_post()
+        liked_post.like_dislike(self.user_profile)
+        with self.assertNumQueries(1):
+            posts = {post.pk: post
+                     for post in Post.objects.with_user_like(self.user_profile.user)}
+        with self.assertNumQueries(0):
+            self.assertTrue(has_user_like(posts[liked_post.pk], self.user_profile.user))
+            self.assertFalse(has_user_like(posts[other_post.pk], self.user_profile.user))
+
+    def test_has_user_like_fallback(self):
+        """
+        test has user like filter queries when post is not annotated
+        """
+        post = self.post_factory.create_post()
+        post.like_dislike(self.user_profile)
+        with self.assertNumQueries(1):
+            self.assertTrue(has_user_like(post, self.user_profile.user))
+
+class PostToggleLikeTest(TestCase):
+    """
+    post toggle like test
+    """
+    def setUp(self):
+        self.user_profile_factory = UserProfileFactory()
+        self.post_factory = PostFactory()
+        self.user_profile = self.user_profile_factory.create_user_profile()
+
+    def assert_toggle_like(self):
+        """
+        assert toggle like comportament
+        """
+        post = self.post_factory.create_post()
+        other_user_profile = self.user_profile_factory.create_user_profile()
+        self.assertEqual(post.toggle_like(self.user_profile), (True, 1))
+        self.assertEqual(post.toggle_like(other_user_profile), (True, 2))
+        self.assertIsNotNone(post.get_like(self.user_profile))
+        self.assertEqual(post.toggle_like(self.user_profile), (False, 1))
+        self.assertIsNone(post.get_like(self.user_profile))
+        post.refresh_from_db()
+        self.assertEqual(post.likes_count, 1)
+
+    def test_toggle_like(self):
+        """
+        test toggle like returns state and count
+        """
+        self.assert_toggle_like()
+
+    @mock.patch("rollsocialnetwork.timeline.models.connection.features."
+                "can_return_columns_from_insert", False)
+    def test_toggle_like_fallback(self):
+        """
+        test toggle like fallback path
+        """
+        self.assert_toggle_like()
+
+    @mock.patch.object(Post, "notify_likes_count")
+    def test_toggle_like_notify(self, notify_likes_count_mock):
+        """
+        test toggle like notifies the new count
+        """
+        post = self.post_factory.create_post()
+        with self.captureOnCommitCallbacks(execute=True):
+            post.toggle_like(self.user_profile)
+        notify_likes_count_mock.assert_called_once_with(post.pk, 1)
+
+    def test_set_like_idempotent(self):
+        """
+        test set like can be repeated
+        """
+        post = self.post_factory.create_post()
+        self.assertEqual(post.set_like(self.user_profile, True), (True, 1))
+        self.assertEqual(post.set_like(self.user_profile, True), (True, 1))
+        self.assertEqual(post.set_like(self.user_profile, False), (False, 0))
+        self.assertEqual(post.set_like(self.user_profile, False), (False, 0))
+
 class PostLikeDislikeViewTest(TestCase):
     """
     post like dislike view test
@@ -142,6 +733,7 @@ class PostLikeDislikeViewTest(TestCase):
             }
         )
         self.assertEqual(response.status_code, 201)
+        self.assertEqual(response["Likes-Count"], "1")
         like = self.post.get_like(self.user_profile)
         self.assertIsNotNone(like)
         self.assertEqual(like.user_profile, self.user_profile)
@@ -153,5 +745,256 @@ class PostLikeDislikeViewTest(TestCase):
             }
         )
         self.assertEqual(response.status_code, 204)
+        self.assertEqual(response["Likes-Count"], "0")
         like = self.post.get_like(self.user_profile)
         self.assertIsNone(like)
+
+class PostLikeViewTest(TestCase):
+    """
+    post like view test
+    """
+    def setUp(self):
+        user_profile_factory = UserProfileFactory()
+        site_factory = SiteFactory()
+        post_factory = PostFactory()
+        self.site = site_factory.create_site()
+        self.user_profile = user_profile_factory.create_user_profile(site=self.site)
+        self.post = post_factory.create_post(user_profile=self.user_profile)
+        self.other_post = post_factory.create_post(user_profile=self.user_profile)
+        self.foreign_post = post_factory.create_post()
+        self.client.force_login(self.user_profile.user)
+
+    def test_put_delete_idempotent(self):
+        """
+        test put and delete can be retried
+        """
+        for _ in range(2):
+            response = self.client.put(f"/t/post/{self.post.pk}/like/",
+                                       SERVER_NAME=self.site.domain)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json(), {
+                "post": self.post.pk,
+                "liked": True,
+                "likes_count": 1,
+            })
+        for _ in range(2):
+            response = self.client.delete(f"/t/post/{self.post.pk}/like/",
+                                          SERVER_NAME=self.site.domain)
+            self.assertEqual(response.json()["liked"], False)
+            self.assertEqual(response.json()["likes_count"], 0)
+        self.assertIsNone(self.post.get_like(self.user_profile))
+
+    def test_batch(self):
+        """
+        test batch applies the last intent per post
+        """
+        response = self.client.post(
+            "/t/likes/",
+            [
+                {"post": self.post.pk, "liked": True},
+                {"post": self.other_post.pk, "liked": True},
+                {"post": self.other_post.pk, "liked": False},
+                {"post": self.foreign_post.pk, "liked": True},
+            ],
+            content_type="application/json",
+            SERVER_NAME=self.site.domain,
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            "results": [
+                {"post": self.post.pk, "liked": True, "likes_count": 1},
+                {"post": self.other_post.pk, "liked": False, "likes_count": 0},
+            ],
+            "not_found": [self.foreign_post.pk],
+        })
+        self.assertIsNotNone(self.post.get_like(self.user_profile))
+        self.assertIsNone(self.foreign_post.get_like(self.user_profile))
+
+    def test_batch_bad_request(self):
+        """
+        test batch rejects malformed bodies
+        """
+        response = self.client.post("/t/likes/",
+                                    {"post": self.post.pk},
+                                    content_type="application/json",
+                                    SERVER_NAME=self.site.domain)
+        self.assertEqual(response.status_code, 400)
+        for intent in ({"post": self.post.pk, "liked": "false"},
+                       {"post": self.post.pk, "liked": 0},
+                       {"post": self.post.pk, "liked": {}},
+                       {"post": str(self.post.pk), "liked": True},
+                       {"post": True, "liked": True}):
+            response = self.client.post("/t/likes/",
+                                        [intent],
+                                        content_type="application/json",
+                                        SERVER_NAME=self.site.domain)
+            self.assertEqual(response.status_code, 400, intent)
+        self.assertFalse(Like.objects.exists())
+
+class LatestPostViewTest(TestCase):
+    """
+    latest post view test
+    """
+    def setUp(self):
+        user_profile_factory = UserProfileFactory()
+        site_factory = SiteFactory()
+        self.site = site_factory.create_site()
+        self.user_profile = user_profile_factory.create_user_profile(site=self.site)
+        self.post_factory = PostFactory()
+        self.client.force_login(self.user_profile.user)
+        cache.clear()
+
+    def test_get(self):
+        """
+        test get returns the roll latest post pk
+        """
+        response = self.client.get("/t/latest/", SERVER_NAME=self.site.domain)
+        self.assertEqual(response.json(), {"latest_post_pk": None})
+        with self.captureOnCommitCallbacks(execute=True):
+            post = self.post_factory.create_post(user_profile=self.user_profile)
+            self.post_factory.create_post()
+        response = self.client.get("/t/latest/", SERVER_NAME=self.site.domain)
+        self.assertEqual(response.json(), {"latest_post_pk": post.pk})
+
+class TimelineSinceViewTest(TestCase):
+    """
+    timeline since view test
+    """
+    def setUp(self):
+        user_profile_factory = UserProfileFactory()
+        site_factory = SiteFactory()
+        self.site = site_factory.create_site()
+        self.user_profile = user_profile_factory.create_user_profile(site=self.site)
+        self.post_factory = PostFactory()
+        cache.clear()
+        self.post = self.post_factory.create_post(user_profile=self.user_profile)
+        self.client.force_login(self.user_profile.user)
+
+    def test_no_new_posts(self):
+        """
+        test no new posts answers from the high-water mark
+        """
+        response = self.client.get(f"/t/since/?slice={self.post.pk}",
+                                   SERVER_NAME=self.site.domain)
+        self.assertEqual(response.json(), {
+            "slice": str(self.post.pk),
+            "has_more": False,
+            "posts": [],
+        })
+
+    @mock.patch("rollsocialnetwork.timeline.views.TimelineSinceView.since_limit", 1)
+    def test_new_posts(self):
+        """
+        test new posts are returned oldest batch first
+        """
+        post_1 = self.post_factory.create_post(user_profile=self.user_profile)
+        post_2 = self.post_factory.create_post(user_profile=self.user_profile)
+        self.post_factory.create_post()
+        response = self.client.get(f"/t/since/?slice={self.post.pk}",
+                                   SERVER_NAME=self.site.domain)
+        data = response.json()
+        self.assertTrue(data["has_more"])
+        self.assertEqual(data["slice"], str(post_1.pk))
+        self.assertEqual([post["pk"] for post in data["posts"]], [post_1.pk])
+        response = self.client.get(f"/t/since/?slice={data['slice']}",
+                                   SERVER_NAME=self.site.domain,
+                                   headers={"AJAX-Request": "true"})
+        self.assertEqual(response["Timeline-Slice"], str(post_2.pk))
+        self.assertEqual(response["Timeline-Has-More"], "false")
+        self.assertContains(response, f'id="post-{post_2.pk}"')
+
+    def test_slice_required(self):
+        """
+        test slice is required
+        """
+        response = self.client.get("/t/since/", SERVER_NAME=self.site.domain)
+        self.assertEqual(response.status_code, 400)
+
+class PostFragmentCacheTest(TestCase):
+    """
+    post fragment cache test
+    """
+    def setUp(self):
+        user_profile_factory = UserProfileFactory()
+        post_factory = PostFactory()
+        self.user_profile = user_profile_factory.create_user_profile()
+        self.post = post_factory.create_post(user_profile=self.user_profile)
+        self.request = RequestFactory().get("/t/")
+        self.request.site = self.user_profile.site
+        self.request.user = self.user_profile.user
+        self.request.user_profile = self.user_profile
+        cache.clear()
+
+    def get_fragment_key(self):
+        """
+        get post card fragment key of the current roll fragments version
+        """
+        version = Post.get_fragments_version(self.user_profile.site_id)
+        return make_template_fragment_key(
+            "timeline-post",
+            [self.post.pk, version, False, "http", settings.LANGUAGE_CODE]
+        )
+
+    def render(self):
+        """
+        render post card
+        """
+        post = Post.objects.select_related("user_profile__site")\
+            .with_user_like(self.user_profile.user)\
+            .get(pk=self.post.pk)
+        return render_to_string("timeline/post.html",
+                                {"post": post, "user": self.user_profile.user},
+                                request=self.request)
+
+    def test_fragment_cached(self):
+        """
+        test post card fragment is cached and invalidated on post save
+        """
+        self.assertIsNone(cache.get(self.get_fragment_key()))
+        content = self.render()
+        self.assertIn(self.user_profile.username, cache.get(self.get_fragment_key()))
+        self.assertEqual(self.render(), content)
+        self.post.save()
+        self.assertIsNone(cache.get(self.get_fragment_key()))
+
+    def test_fragment_kept_on_post_creation(self):
+        """
+        test creating a post does not invalidate the roll fragments
+        """
+        self.render()
+        version = Post.get_fragments_version(self.user_profile.site_id)
+        PostFactory().create_post(user_profile=self.user_profile)
+        self.assertEqual(Post.get_fragments_version(self.user_profile.site_id), version)
+        self.assertIsNotNone(cache.get(self.get_fragment_key()))
+
+    def test_fragment_varies_on_scheme(self):
+        """
+        test fragments of external post links vary on the request scheme
+        """
+        self.request.site = SiteFactory().create_site()
+        with override_settings(OVERRIDE_SCHEME=None):
+            self.assertIn(f"http://{self.user_profile.site.domain}/", self.render())
+            self.request = RequestFactory().get("/t/", secure=True)
+            self.request.site = SiteFactory().create_site()
+            self.request.user = self.user_profile.user
+            self.assertIn(f"https://{self.user_profile.site.domain}/", self.render())
+
+    def test_fragment_invalidated_on_user_profile_and_site_save(self):
+        """
+        test fragments are invalidated when the username or domain change
+        """
+        self.render()
+        self.user_profile.username = "renamed"
+        self.user_profile.save()
+        self.assertIsNone(cache.get(self.get_fragment_key()))
+        self.assertIn("renamed", self.render())
+        self.user_profile.site.save()
+        self.assertIsNone(cache.get(self.get_fragment_key()))
+
+    def test_like_state_not_cached(self):
+        """
+        test likes count and viewer like state are rendered out of the fragment
+        """
+        self.render()
+        self.post.toggle_like(self.user_profile)
+        self.assertIn('initial-has-like', self.render())
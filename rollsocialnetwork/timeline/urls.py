@@ -4,16 +4,28 @@ timeline urls
 from django.urls import path
 from .views import (
     TimelineView,
+    TimelineSinceView,
+    LatestPostView,
     PostCreateView,
     PostLikeDislikeView,
+    PostLikeView,
+    PostLikesBatchView,
 )
 
 urlpatterns = [
     path("", TimelineView.as_view(), name="timeline"),
+    path("since/", TimelineSinceView.as_view(), name="timeline-since"),
+    path("latest/", LatestPostView.as_view(), name="timeline-latest"),
     path("create-post/",
          PostCreateView.as_view(),
          name='timeline-create-post'),
     path("post/<int:pk>/like-dislike/",
          PostLikeDislikeView.as_view(),
          name='timeline-post-like-dislike'),
+    path("post/<int:pk>/like/",
+         PostLikeView.as_view(),
+         name='timeline-post-like'),
+    path("likes/",
+         PostLikesBatchView.as_view(),
+         name='timeline-likes-batch'),
 ]
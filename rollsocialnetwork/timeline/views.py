@@ -1,21 +1,33 @@
 """
 timeline views
 """
+import json
 from django.http import (
     HttpResponse,
     HttpResponseBadRequest,
     HttpResponseRedirect,
+    JsonResponse,
 )
+from django.template.response import TemplateResponse
 from django.urls import reverse
+from django.views.generic.base import View
 from django.views.generic.list import ListView
 from django.views.generic.edit import CreateView
-from django.views.generic.detail import DetailView
+from django.views.generic.detail import (
+    DetailView,
+    SingleObjectMixin,
+)
+from django.db import transaction
 from django.forms.models import BaseModelForm
 from django.db.models.query import QuerySet
 from django.conf import settings
+from easy_thumbnails.templatetags.thumbnail import thumbnail_url  # type: ignore[import-untyped]
 from rollsocialnetwork.http_request import HttpRequest
 from rollsocialnetwork.social.mixins import UserProfileRequiredMixin
-from .models import Post
+from .models import (
+    FeedEntry,
+    Post,
+)
 from .mixins import TimelineViewMixin
 
 class TimelineView(UserProfileRequiredMixin,  # pylint: disable=R0901
@@ -25,18 +37,48 @@ class TimelineView(UserProfileRequiredMixin,  # pylint: disable=R0901
     timeline view
     """
     model = Post
-    ordering = ["-created_at"]
+    ordering = ["-created_at", "-pk"]
     paginate_by = 10
 
-    def get_queryset(self) -> QuerySet[Post]:
+    def get_base_queryset(self) -> QuerySet[Post]:
         """
-        get queryset
+        get base queryset, the site timeline posts
         """
         queryset = super().get_queryset()
         if not self.is_home_site():
             queryset = queryset.filter(  # type: ignore[attr-defined]
                 user_profile__site=self.request.site)
-        return self.build_sliced_queryset(queryset)
+        return queryset.select_related("user_profile__site")\
+            .with_user_like(self.request.user)  # type: ignore[attr-defined]
+
+    def get_queryset(self) -> QuerySet[Post]:
+        """
+        get queryset
+        """
+        return self.build_sliced_queryset(self.get_base_queryset())
+
+    def paginate_queryset(self, queryset, page_size):
+        """
+        paginate queryset, by cursor unless a page is requested without it
+        """
+        if not self.is_cursor_pagination():
+            return super().paginate_queryset(queryset, page_size)
+        page = self.build_cursor_page(queryset, page_size)
+        return (None, page, page.object_list, page.has_other_pages())
+
+    def get_cursor_object_list(self, queryset, limit: int, cursor=None):
+        """
+        get cursor object list from the materialized feed
+        """
+        post_pks = FeedEntry.read(self.request.site.id,
+                                  limit,
+                                  cursor=cursor,
+                                  slice_pk=self.get_slice_value())
+        if len(post_pks) < limit:
+            # feeds are trimmed, the tail of the timeline comes from the post table
+            return super().get_cursor_object_list(queryset, limit, cursor=cursor)
+        posts = queryset.in_bulk(post_pks)
+        return [posts[pk] for pk in post_pks if pk in posts]
 
     def is_home_site(self):
         """
@@ -52,6 +94,79 @@ class TimelineView(UserProfileRequiredMixin,  # pylint: disable=R0901
             return ["timeline/post_list_ajax.html"]
         return super().get_template_names()
 
+class TimelineSinceView(TimelineView):  # pylint: disable=R0901
+    """
+    timeline since view
+
+    posts newer than the slice, oldest first, so clients can prepend them
+    to the feed. Renders the posts fragment for AJAX-Request, json otherwise.
+    """
+    since_limit = 50
+
+    def get_since_posts(self, slice_pk: int) -> tuple[list[Post], bool]:
+        """
+        get since posts, returns (posts, has more)
+        """
+        latest_pk = Post.get_latest_pk(self.request.site.id)
+        if latest_pk is None or latest_pk <= slice_pk:
+            return [], False
+        posts = list(self.get_base_queryset()
+                     .filter(pk__gt=slice_pk)
+                     .order_by("pk")[:self.since_limit + 1])
+        return posts[:self.since_limit], len(posts) > self.since_limit
+
+    def serialize_post(self, post: Post) -> dict:
+        """
+        serialize post
+        """
+        return {
+            "pk": post.pk,
+            "username": post.user_profile.username,  # type: ignore[attr-defined]
+            "site": post.user_profile.site.domain,  # type: ignore[attr-defined]
+            "photo": thumbnail_url(post.photo, "photo584"),
+            "created_at": post.created_at.isoformat(),  # type: ignore[union-attr]
+            "likes_count": post.likes_count,
+            "liked": post.user_has_like,  # type: ignore[attr-defined]
+        }
+
+    def get(self, request: HttpRequest, *args, **kwargs):  # type: ignore[override]
+        slice_value = self.get_slice_value()
+        if not slice_value or not slice_value.isdigit():
+            return HttpResponseBadRequest(f"{self.slice_kwarg} is required")
+        posts, has_more = self.get_since_posts(int(slice_value))
+        new_slice = str(posts[-1].pk) if posts else slice_value
+        headers = {
+            "Timeline-Slice": new_slice,
+            "Timeline-Has-More": "true" if has_more else "false",
+        }
+        if request.headers.get("AJAX-Request") == "true":
+            return TemplateResponse(request,  # type: ignore[call-arg]
+                                    "timeline/post_list_since.html",
+                                    {"posts": list(reversed(posts))},
+                                    headers=headers)
+        return JsonResponse({
+            "slice": new_slice,
+            "has_more": has_more,
+            "posts": [self.serialize_post(post) for post in reversed(posts)],
+        }, headers=headers)
+
+class LatestPostView(UserProfileRequiredMixin,
+                     View):
+    """
+    latest post view
+
+    exposes the latest post pk of the current roll timeline, cheap to poll
+    """
+    http_method_names = ["get"]
+
+    def get(self, request: HttpRequest, *args, **kwargs):  # pylint: disable=W0613
+        """
+        get
+        """
+        return JsonResponse({
+            "latest_post_pk": Post.get_latest_pk(request.site.id),  # type: ignore[attr-defined]
+        })
+
 class PostCreateView(UserProfileRequiredMixin,
                      CreateView):
     """
@@ -83,12 +198,13 @@ class PostLikeDislikeView(UserProfileRequiredMixin,
         user_profile = request.user_profile
         if not user_profile:
             return HttpResponseBadRequest()
-        like = post.like_dislike(user_profile)
+        has_like, likes_count = post.toggle_like(user_profile)
         success_url = self.get_success_url()
         action_component = request.headers.get("Action-Component")
         if action_component == "like-dislike":
-            status_code = 201 if like else 204
-            return HttpResponse(status=status_code)
+            status_code = 201 if has_like else 204
+            return HttpResponse(status=status_code,
+                                headers={"Likes-Count": str(likes_count)})
         return HttpResponseRedirect(success_url)
 
     def get_success_url(self) -> str:
@@ -98,3 +214,102 @@ class PostLikeDislikeView(UserProfileRequiredMixin,
         post_pk = self.kwargs.get(self.pk_url_kwarg)
         reverse_timeline = reverse("timeline")
         return f"{reverse_timeline}#post-{post_pk}"
+
+class PostLikeView(UserProfileRequiredMixin,
+                   SingleObjectMixin,
+                   View):
+    """
+    post like view
+
+    idempotent like (PUT) and unlike (DELETE), safe to retry
+    """
+    model = Post
+    http_method_names = ["put", "delete"]
+    request: HttpRequest
+
+    def get_queryset(self) -> QuerySet[Post]:
+        return Post.objects.filter(user_profile__site=self.request.site)
+
+    def set_like(self, has_like: bool) -> JsonResponse:
+        """
+        set like
+        """
+        post: Post = self.get_object()  # type: ignore[assignment]
+        has_like, likes_count = post.set_like(self.request.user_profile,  # type: ignore[arg-type]
+                                              has_like)
+        return JsonResponse({
+            "post": post.pk,
+            "liked": has_like,
+            "likes_count": likes_count,
+        })
+
+    def put(self, request: HttpRequest, *args, **kwargs):  # pylint: disable=W0613
+        """
+        put
+        """
+        return self.set_like(True)
+
+    def delete(self, request: HttpRequest, *args, **kwargs):  # pylint: disable=W0613
+        """
+        delete
+        """
+        return self.set_like(False)
+
+class PostLikesBatchView(UserProfileRequiredMixin,
+                         View):
+    """
+    post likes batch view
+
+    applies a list of {"post": pk, "liked": bool} intents in one
+    transaction, the last intent of a post wins
+    """
+    http_method_names = ["post"]
+    max_intents = 100
+    request: HttpRequest
+
+    def get_intents(self) -> dict[int, bool]:
+        """
+        get intents from the json body
+        """
+        error = "body must be a list of {post: int, liked: bool} objects"
+        try:
+            data = json.loads(self.request.body)
+            intents = {intent["post"]: intent["liked"] for intent in data}
+        except (ValueError, TypeError, KeyError) as e:
+            raise ValueError(error) from e
+        if not isinstance(data, list):
+            raise ValueError(error)
+        # strict JSON types, "false" or 0 must not be taken for a like on retries
+        for pk, liked in intents.items():
+            if isinstance(pk, bool) or not isinstance(pk, int) or not isinstance(liked, bool):
+                raise ValueError(error)
+        if len(intents) > self.max_intents:
+            raise ValueError(f"at most {self.max_intents} posts per batch")
+        return intents
+
+    def post(self, request: HttpRequest, *args, **kwargs):  # pylint: disable=W0613
+        """
+        post
+        """
+        try:
+            intents = self.get_intents()
+        except ValueError as e:
+            return HttpResponseBadRequest(str(e))
+        posts = Post.objects.filter(user_profile__site=request.site,
+                                    pk__in=intents.keys())\
+            .only("pk")\
+            .in_bulk()
+        results = []
+        with transaction.atomic():
+            for pk in sorted(posts.keys()):
+                has_like, likes_count = posts[pk].set_like(request.user_profile,  # type: ignore[arg-type]
+                                                           intents[pk])
+                results.append({
+                    "post": pk,
+                    "liked": has_like,
+                    "likes_count": likes_count,
+                })
+        return JsonResponse({
+            "results": results,
+            "not_found": sorted(set(intents.keys()) - set(posts.keys())),
+        })
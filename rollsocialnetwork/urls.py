@@ -20,6 +20,8 @@ from .views import (
     RollsView,
     CreateRollView,
     LoginView,
+    WatcherEventsView,
+    WatcherMetricsView,
 )
 
 urlpatterns = [
@@ -44,6 +46,12 @@ urlpatterns = [
     path("logout/",
          LogoutView.as_view(),
          name="logout"),
+    path("watcher/events/",
+         WatcherEventsView.as_view(),
+         name="watcher-events"),
+    path("watcher/metrics/",
+         WatcherMetricsView.as_view(),
+         name="watcher-metrics"),
     path("s/",
          include("rollsocialnetwork.social.urls")),
     path("t/",
@@ -2,28 +2,43 @@
 rollsocialnetwork utils
 """
 
-from typing import Optional
-from datetime import timedelta
+from typing import (
+    Any,
+    Callable,
+    Optional,
+)
 from django.db.models import (
     QuerySet,
-    Count,
-    Q
+    F,
 )
 from django.contrib.sites.models import Site
 from django.conf import settings
-from django.utils import timezone
+from django.http import HttpRequest
+from django.utils.functional import SimpleLazyObject
 
 
 def get_popular_rolls(qs: Optional[QuerySet[Site]] = None) -> QuerySet[Site]:
     """
-    get popular sites
+    get popular sites, sorted on the time-decayed hot score of the
+    precomputed roll stats
     """
-    if not qs:
+    if qs is None:
         qs = Site.objects.exclude(id=settings.HOME_SITE_ID)
-    hot_posts_slice = timezone.now() - timedelta(hours=settings.HOT_POSTS_SLICE)
-    hot_posts_slice_filter = Q(profiles__posts__created_at__gte=hot_posts_slice)
-    return qs.annotate(profiles_count=Count("profiles"),
-                       posts_count=Count("profiles__posts"),
-                       hot_posts_count=Count("profiles__posts",
-                                             filter=hot_posts_slice_filter))\
-                        .order_by("-hot_posts_count", "-posts_count", "-profiles_count")
+    return qs.annotate(profiles_count=F("stats__profiles_count"),
+                       posts_count=F("stats__posts_count"),
+                       hot_posts_count=F("stats__hot_posts_count"))\
+                        .order_by("-stats__hot_score",
+                                  "-stats__posts_count",
+                                  "-stats__profiles_count")
+
+def request_memoized(request: HttpRequest,
+                     name: str,
+                     func: Callable[[], Any]) -> SimpleLazyObject:
+    """
+    lazy value of func, evaluated on first use and memoized on the request
+    so every template rendered by the request shares it
+    """
+    memo = request.__dict__.setdefault("_memoized", {})
+    if name not in memo:
+        memo[name] = SimpleLazyObject(func)
+    return memo[name]
@@ -1,14 +1,23 @@
 """
 rollsocialnetwork views
 """
+import asyncio
+import hmac
+import json
 from typing import (
+    AsyncIterator,
     Dict,
-    List
+    List,
+    Optional,
 )
+from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer  # type: ignore[import-untyped]
 from django.http import (
     HttpResponse,
+    HttpResponseBadRequest,
     HttpResponseForbidden,
-    HttpResponseRedirect
+    HttpResponseRedirect,
+    StreamingHttpResponse,
 )
 from django.views.generic import (
     View,
@@ -24,7 +33,15 @@ from django.db.models import QuerySet
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.urls import reverse
 from .forms import RollForm
+from .metrics import registry as metrics
 from .utils import get_popular_rolls
+from .watcher import (
+    Watcher,
+    track_groups,
+)
+
+SSE_STREAMS_ACTIVE = metrics.gauge("watcher_sse_streams_active",
+                                   "Watcher Server-Sent Events streams open.")
 
 class LogoutView(View):
     """
@@ -129,3 +146,126 @@ class LoginView(RedirectView):
         if qs:
             url = f"{url}?{qs}"
         return url
+
+class WatcherEventsView(View):
+    """
+    watcher events view
+
+    Server-Sent Events fallback of ws/watcher/ for read-only subscribers.
+    The refs query param is a JSON list of watcher refs, e.g.
+    ?refs=[{"model": "posts", "attr": "likes_count", "pk": 1}]. The
+    stream starts with the current values, then follows the channel layer
+    groups. Event ids are the dot separated seqs of the refs, so the
+    Last-Event-ID sent by EventSource on reconnect resumes the stream.
+    """
+
+    def parse_last_event_id(self, count: int) -> Optional[List[int]]:
+        """
+        parse Last-Event-ID seqs, None when it does not match the refs
+        """
+        last_event_id = self.request.headers.get("Last-Event-ID", "")
+        try:
+            seqs = [int(seq) for seq in last_event_id.split(".")]
+        except ValueError:
+            return None
+        return seqs if len(seqs) == count else None
+
+    def build_event(self, message: Dict, seqs: Dict[str, int]) -> str:
+        """
+        build event
+        """
+        seqs[message["group_name"]] = message["seq"]
+        event_id = ".".join(str(seq) for seq in seqs.values())
+        return f"id: {event_id}\ndata: {json.dumps(message)}\n\n"
+
+    async def events(self, group_names: Dict, seqs: Dict[str, int]) -> AsyncIterator[str]:
+        """
+        events stream
+        """
+        Watcher.attach_event_loop()
+        channel_layer = get_channel_layer()
+        channel_name = await channel_layer.new_channel()
+        SSE_STREAMS_ACTIVE.inc()
+        track_groups(group_names, 1)
+        try:
+            await asyncio.gather(*[
+                channel_layer.group_add(group_name, channel_name)
+                for group_name in group_names
+            ])
+            yield f"retry: {settings.WATCHER_SSE_RETRY}\n\n"
+            snapshot = await sync_to_async(Watcher.get_snapshot)([
+                destructed_ref for _, destructed_ref in group_names.values()
+            ])
+            for message in snapshot:
+                if message["seq"] and message["seq"] == seqs[message["group_name"]]:
+                    continue
+                yield self.build_event(message, seqs)
+            while True:
+                try:
+                    message = await asyncio.wait_for(channel_layer.receive(channel_name),
+                                                     settings.WATCHER_SSE_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ": heartbeat\n\n"
+                    continue
+                if message.get("group_name") in seqs:
+                    yield self.build_event(message, seqs)
+        finally:
+            SSE_STREAMS_ACTIVE.dec()
+            track_groups(group_names, -1)
+            await asyncio.gather(*[
+                channel_layer.group_discard(group_name, channel_name)
+                for group_name in group_names
+            ])
+
+    async def get(self, request):
+        """
+        get
+        """
+        try:
+            refs = json.loads(request.GET.get("refs", ""))
+            group_names = Watcher.build_group_names(refs)
+        except ValueError as error:
+            return HttpResponseBadRequest(str(error))
+        if not group_names:
+            return HttpResponseBadRequest("refs must not be empty")
+        if len(group_names) > settings.WATCHER_MAX_SUBSCRIPTIONS:
+            return HttpResponseBadRequest("subscriptions limit exceeded")
+        last_event_seqs = self.parse_last_event_id(len(group_names))
+        seqs = {}
+        for index, (group_name, (ref, _)) in enumerate(group_names.items()):
+            seqs[group_name] = last_event_seqs[index] if last_event_seqs else ref.get("seq", 0)
+        return StreamingHttpResponse(
+            self.events(group_names, seqs),
+            content_type="text/event-stream",
+            headers={
+                "Cache-Control": "no-cache",
+                "X-Accel-Buffering": "no",
+            }
+        )
+
+class WatcherMetricsView(View):
+    """
+    watcher metrics view
+
+    Prometheus text exposition of the process metrics, for staff users or
+    requests with the WATCHER_METRICS_TOKEN bearer token
+    """
+
+    def has_permission(self) -> bool:
+        """
+        has permission
+        """
+        if self.request.user.is_staff:
+            return True
+        token = settings.WATCHER_METRICS_TOKEN
+        authorization = self.request.headers.get("Authorization", "")
+        return bool(token) and hmac.compare_digest(authorization, f"Bearer {token}")
+
+    def get(self, request):
+        """
+        get
+        """
+        if not self.has_permission():
+            return HttpResponseForbidden()
+        return HttpResponse(metrics.render(),
+                            content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -2,18 +2,298 @@
 rollsocialnetwork watcher
 """
 
+import asyncio
+import collections
+import logging
+import struct
+import threading
+import time
 from typing import (
+    Any,
+    Callable,
     Dict,
+    Iterable,
+    List,
     Optional,
-    Tuple
+    Tuple,
+    Type,
 )
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer  # type: ignore[import-untyped]
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import (
+    Model,
+    signals,
+)
+from .metrics import (
+    observe_buckets,
+    registry as metrics,
+    render_histogram,
+)
+
+logger = logging.getLogger(__name__)
+
+VALUE_CACHE_KEY = "watcher:value:{group_name}"
+SEQ_CACHE_KEY = "watcher:seq:{group_name}"
+
+Loader = Callable[[List[Any]], Dict[Any, Any]]
+Trigger = Callable[..., Iterable[Any]]
+
+NOTIFY_TOTAL = metrics.counter("watcher_notify_total",
+                               "Watcher.notify calls.")
+NOTIFY_SECONDS = metrics.histogram("watcher_notify_seconds",
+                                   "Time Watcher.notify blocks the caller.")
+NOTIFY_COALESCED_TOTAL = metrics.counter("watcher_notify_coalesced_total",
+                                         "Notifications replaced by a newer one before the flush.")
+FLUSH_MESSAGES = metrics.histogram("watcher_flush_messages",
+                                   "Messages sent per coalesced flush.",
+                                   buckets=(1, 5, 10, 50, 100, 500, 1000))
+GROUP_SEND_SECONDS = metrics.histogram("watcher_group_send_seconds",
+                                       "Channel layer group_send duration.")
+GROUP_SIZE_BUCKETS = (1, 2, 5, 10, 50, 100, 500, 1000, 5000)
+
+# subscribers of this process by group name
+local_groups: collections.Counter = collections.Counter()
+
+def track_groups(group_names: Iterable[str], delta: int) -> None:
+    """
+    track the local subscribers of groups, delta is 1 on add, -1 on discard
+    """
+    for group_name in group_names:
+        local_groups[group_name] += delta
+        if local_groups[group_name] <= 0:
+            del local_groups[group_name]
+
+@metrics.collector
+def collect_group_sizes() -> List[str]:
+    """
+    collect the local group sizes histogram
+    """
+    sizes = list(local_groups.values())
+    return [
+        "# HELP watcher_groups Groups with local subscribers.",
+        "# TYPE watcher_groups gauge",
+        f"watcher_groups {len(sizes)}",
+    ] + render_histogram("watcher_group_size",
+                         "Local subscribers per group.",
+                         GROUP_SIZE_BUCKETS,
+                         observe_buckets(GROUP_SIZE_BUCKETS, sizes),
+                         sum(sizes))
+
+async def group_send(group_name: str, message: Dict) -> None:
+    """
+    timed channel layer group send
+    """
+    started_at = time.perf_counter()
+    await get_channel_layer().group_send(group_name, message)
+    GROUP_SEND_SECONDS.observe(time.perf_counter() - started_at)
+
+BINARY_SUBPROTOCOL = "watcher.binary.v1"
+BINARY_VERSION = 1
+BINARY_HEADER = struct.Struct("!BH")
+BINARY_RECORD = struct.Struct("!BQQq")
+BINARY_NULL = -2 ** 63
+BINARY_MAX_RECORDS = 2 ** 16 - 1
+
+def pack_messages(messages: List[Dict]) -> Tuple[List[bytes], List[Dict]]:
+    """
+    pack messages in binary frames
+
+    frame: version u8, count u16, count * record(code u8, pk u64, seq u64,
+    value i64), network byte order; a null value is sent as the i64 minimum.
+    Messages that do not fit the layout are returned to be sent as JSON.
+    """
+    records = []
+    unpacked = []
+    for message in messages:
+        watched = Watcher.registry.get(message["type"])
+        code = watched.code if watched else None
+        value = message.get(message["type"].split(".", 1)[1])
+        try:
+            pk = int(message["pk"] or 0)
+            if value is None:
+                value = BINARY_NULL
+            records.append(BINARY_RECORD.pack(code, pk, message.get("seq", 0), value))
+        except (TypeError, ValueError, struct.error):
+            unpacked.append(message)
+    frames = []
+    for offset in range(0, len(records), BINARY_MAX_RECORDS):
+        chunk = records[offset:offset + BINARY_MAX_RECORDS]
+        frames.append(BINARY_HEADER.pack(BINARY_VERSION, len(chunk)) + b"".join(chunk))
+    return frames, unpacked
+
+def unpack_frame(frame: bytes) -> List[Tuple[int, int, int, Optional[int]]]:
+    """
+    unpack binary frame in (code, pk, seq, value) records
+    """
+    version, count = BINARY_HEADER.unpack_from(frame)
+    if version != BINARY_VERSION:
+        raise ValueError(f"unsupported frame version {version}")
+    records = []
+    for index in range(count):
+        code, pk, seq, value = BINARY_RECORD.unpack_from(
+            frame,
+            BINARY_HEADER.size + index * BINARY_RECORD.size
+        )
+        records.append((code, pk, seq, None if value == BINARY_NULL else value))
+    return records
+
+class CoalescingNotifier:
+    """
+    CoalescingNotifier class
+
+    keeps only the latest message per group and sends the pending messages
+    once per window, out of the request path. The messages are sent on the
+    event loop of the watcher consumers, set by their async entry points
+    while it runs, otherwise from the timer thread.
+    """
+
+    def __init__(self, window: float) -> None:
+        self.window = window
+        self._pending: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def push(self, group_name: str, message: Dict) -> None:
+        """
+        push message, replacing the pending one of the same group
+        """
+        with self._lock:
+            if group_name in self._pending:
+                NOTIFY_COALESCED_TOTAL.inc()
+            self._pending[group_name] = message
+            if self._timer is None:
+                self._timer = threading.Timer(self.window, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def set_loop(self, loop: asyncio.AbstractEventLoop) -> None:
+        """
+        set the event loop the messages are sent on, the in-memory channel
+        layer only wakes up the consumers waiting on their own loop
+        """
+        with self._lock:
+            self._loop = loop
+
+    def flush(self) -> None:
+        """
+        flush pending messages
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            loop = self._loop
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not pending:
+            return
+        FLUSH_MESSAGES.observe(len(pending))
+        try:
+            if loop is not None and loop.is_running():
+                asyncio.run_coroutine_threadsafe(self.send(pending), loop).result()
+            else:
+                async_to_sync(self.send)(pending)
+        except Exception:  # pylint: disable=broad-exception-caught
+            logger.exception("watcher notifications flush failed")
+
+    async def send(self, pending: Dict[str, Dict]) -> None:
+        """
+        send pending messages to their groups
+        """
+        for group_name, message in pending.items():
+            await group_send(group_name, message)
+
+class WatchedAttribute:
+    """
+    WatchedAttribute class
+
+    declared once with Watcher.watch, it validates refs, loads the current
+    values in bulk and refreshes them when a trigger model changes
+    """
+
+    def __init__(self,
+                 model: str,
+                 attr: str,
+                 code: int,
+                 loader: Loader) -> None:
+        self.model = model
+        self.attr = attr
+        self.code = code
+        self.loader = loader
+
+    def __repr__(self) -> str:
+        return f"<WatchedAttribute {self.type}>"
+
+    @property
+    def type(self) -> str:
+        """
+        message type
+        """
+        return f"{self.model}.{self.attr}"
+
+    def refresh(self, pks: Iterable[Any]) -> None:
+        """
+        load the current values of pks and notify them
+        """
+        for pk, value in self.loader(list(pks)).items():
+            Watcher.notify(self.model, self.attr, value, pk=pk)
+
+    def connect(self, sender: Type[Model], trigger: Trigger) -> None:
+        """
+        refresh the pks returned by trigger(instance, **signal_kwargs) once
+        a sender instance save or delete is committed
+        """
+        def refresh_on_commit(instance, raw=False, **kwargs):
+            if raw:
+                return
+            pks = list(trigger(instance, **kwargs))
+            if pks:
+                transaction.on_commit(lambda: self.refresh(pks))
+        for signal in (signals.post_save, signals.post_delete):
+            signal.connect(refresh_on_commit,
+                           sender=sender,
+                           weak=False,
+                           dispatch_uid=f"watcher:{self.type}:{sender._meta.label}")
 
 class Watcher:
     """
     Watcher class
     """
+    notifier: Optional[CoalescingNotifier] = None
+    registry: Dict[str, WatchedAttribute] = {}
+
+    @classmethod
+    def watch(cls,
+              model: str,
+              attr: str,
+              code: int,
+              loader: Loader,
+              triggers: Optional[Dict[Type[Model], Trigger]]=None) -> WatchedAttribute:
+        """
+        declare a watched attribute
+
+        code identifies the type in binary frames, loader receives a list
+        of pks and returns the current values by pk, triggers maps models to
+        functions returning the pks to refresh on their save or delete
+        """
+        watched = WatchedAttribute(model, attr, code, loader)
+        for registered in cls.registry.values():
+            if registered.code == code and registered.type != watched.type:
+                raise ValueError(f"code {code} already used by {registered.type}")
+        cls.registry[watched.type] = watched
+        for sender, trigger in (triggers or {}).items():
+            watched.connect(sender, trigger)
+        return watched
+
+    @classmethod
+    def get_codes(cls) -> Dict[str, int]:
+        """
+        get binary codes by message type
+        """
+        return {type_: watched.code for type_, watched in cls.registry.items()}
 
     @classmethod
     def build_group_name(cls, model: str, attr: str, pk: Optional[(str | int)]=None) -> str:
@@ -33,22 +313,165 @@ class Watcher:
         attr = ref.get("attr")
         if not attr:
             raise ValueError("ref.attr field is required")
+        if f"{model}.{attr}" not in cls.registry:
+            raise ValueError(f"{model}.{attr} is not watched")
         pk = ref.get("pk")
         return model, attr, pk
 
+    @classmethod
+    def build_group_names(cls, refs) -> Dict[str, Tuple[Dict, Tuple[str, str, Optional[str]]]]:
+        """
+        build group names of a ref list, raises ValueError on invalid refs
+        """
+        if not isinstance(refs, list):
+            raise ValueError("refs must be a list")
+        group_names = {}
+        for ref in refs:
+            if not isinstance(ref, dict):
+                raise ValueError("ref must be an object")
+            model, attr, pk = cls.destructe_ref(ref)
+            group_names[cls.build_group_name(model, attr, pk=pk)] = (ref, (model, attr, pk))
+        return group_names
+
+    @classmethod
+    def build_message(cls,
+                      model: str,
+                      attr: str,
+                      value,
+                      pk: Optional[(str | int)]=None,
+                      seq: int=0) -> Dict:
+        """
+        build message
+
+        seq is the group sequence number of the value, 0 when unknown
+        """
+        return {
+            "type": f"{model}.{attr}",
+            "pk": pk,
+            "group_name": cls.build_group_name(model, attr, pk=pk),
+            "seq": seq,
+            attr: value
+        }
+
+    @classmethod
+    def next_seq(cls, group_name: str) -> int:
+        """
+        next sequence number of group
+        """
+        key = SEQ_CACHE_KEY.format(group_name=group_name)
+        cache.add(key, 0, settings.WATCHER_VALUE_TIMEOUT)
+        try:
+            return cache.incr(key)
+        except ValueError:
+            # expired between add and incr
+            cache.set(key, 1, settings.WATCHER_VALUE_TIMEOUT)
+            return 1
+
+    @classmethod
+    def store_value(cls, group_name: str, value, seq: int=0) -> None:
+        """
+        store current value of group
+
+        the stored (seq, value) pair is the replay buffer of the group,
+        watched attributes are last-value-wins so only the latest is kept
+        """
+        cache.set(VALUE_CACHE_KEY.format(group_name=group_name),
+                  (seq, value),
+                  settings.WATCHER_VALUE_TIMEOUT)
+
+    @classmethod
+    def forget_values(cls, model: str, attr: str, pks: Iterable[(str | int)]) -> None:
+        """
+        forget stored values, they are loaded again on next snapshot
+        """
+        cache.delete_many([
+            VALUE_CACHE_KEY.format(group_name=cls.build_group_name(model, attr, pk=pk))
+            for pk in pks
+        ])
+
+    @classmethod
+    def load_values(cls, misses: Dict[Tuple[str, str], List]) -> Dict[Tuple, Tuple[int, Any]]:
+        """
+        load missed values in bulk per (model, attr) and store them,
+        returns the (seq, value) by (model, attr, pk)
+        """
+        values = {}
+        for (model, attr), pks in misses.items():
+            try:
+                loaded_values = cls.registry[f"{model}.{attr}"].loader(pks)
+            except (TypeError, ValueError):
+                logger.warning("invalid watcher refs %s.%s: %s", model, attr, pks)
+                continue
+            loaded_by_pk = {str(pk): value for pk, value in loaded_values.items()}
+            for pk in pks:
+                if str(pk) in loaded_by_pk:
+                    # the sequence number of a loaded value is unknown
+                    values[(model, attr, pk)] = (0, loaded_by_pk[str(pk)])
+        for (model, attr, pk), seq_value in values.items():
+            # do not overwrite a value notified meanwhile
+            cache.add(VALUE_CACHE_KEY.format(group_name=cls.build_group_name(model, attr, pk=pk)),
+                      seq_value,
+                      settings.WATCHER_VALUE_TIMEOUT)
+        return values
+
+    @classmethod
+    def get_snapshot(cls, refs: List[Tuple[str, str, Optional[str]]]) -> List[Dict]:
+        """
+        get snapshot messages of refs
+
+        values are read from the value store in one lookup, misses are
+        loaded in bulk per (model, attr) and stored
+        """
+        keys = {
+            VALUE_CACHE_KEY.format(group_name=cls.build_group_name(model, attr, pk=pk)):
+            (model, attr, pk)
+            for model, attr, pk in refs
+        }
+        stored: Dict[str, Any] = cache.get_many(keys.keys())
+        values = {keys[key]: seq_value for key, seq_value in stored.items()}
+        misses: Dict[Tuple[str, str], List] = {}
+        for key, (model, attr, pk) in keys.items():
+            if key not in stored and f"{model}.{attr}" in cls.registry:
+                misses.setdefault((model, attr), []).append(pk)
+        values.update(cls.load_values(misses))
+        return [cls.build_message(model, attr, value, pk=pk, seq=seq)
+                for (model, attr, pk), (seq, value) in values.items()]
+
+    @classmethod
+    def get_notifier(cls) -> CoalescingNotifier:
+        """
+        get the process coalescing notifier
+        """
+        if cls.notifier is None:
+            cls.notifier = CoalescingNotifier(settings.WATCHER_NOTIFY_WINDOW)
+        return cls.notifier
+
+    @classmethod
+    def attach_event_loop(cls) -> None:
+        """
+        attach the running event loop to the process notifier, called by
+        the async entry points of the watcher consumers
+        """
+        cls.get_notifier().set_loop(asyncio.get_running_loop())
+
     @classmethod
     def notify(cls, model: str, attr: str, value, pk: Optional[(str | int)]=None) -> None:
         """
         notify
+
+        numbers the value in its group sequence and stores it for snapshots
+        and resumes, then the message is coalesced per group over
+        WATCHER_NOTIFY_WINDOW seconds, sent synchronously when the window
+        is zero
         """
-        channel_layer = get_channel_layer()
+        started_at = time.perf_counter()
+        NOTIFY_TOTAL.inc()
         group_name = cls.build_group_name(model, attr, pk=pk)
-        async_to_sync(channel_layer.group_send)(
-            group_name,
-            {
-                "type": f"{model}.{attr}",
-                "pk": pk,
-                "group_name": group_name,
-                attr: value
-            }
-        )
+        seq = cls.next_seq(group_name)
+        message = cls.build_message(model, attr, value, pk=pk, seq=seq)
+        cls.store_value(group_name, value, seq=seq)
+        if settings.WATCHER_NOTIFY_WINDOW <= 0:
+            async_to_sync(group_send)(group_name, message)
+        else:
+            cls.get_notifier().push(group_name, message)
+        NOTIFY_SECONDS.observe(time.perf_counter() - started_at)